@@ -0,0 +1,67 @@
+import asyncio
+from typing import AsyncIterator
+from parser import IncrementalParser
+
+# Input is fed to the parser at most this much at a time, handing control
+# back to the event loop in between, however large the chunks that arrive.
+FEED_SIZE = 1 << 16
+
+class StreamParser(IncrementalParser):
+    # An IncrementalParser for a stream of values written one after another,
+    # as in NDJSON or concatenated JSON. Each finished top-level value is
+    # added to `values` instead of ending the parse, and indexes in errors
+    # start over with every value, as if it had been parsed on its own.
+    def __init__(self):
+        super().__init__()
+        self.values = []
+
+    def add(self, value) -> None:
+        if self.stack:
+            super().add(value)
+            return
+
+        self.values.append(value)
+        self.pointer = -1
+
+    def take(self) -> list:
+        values = self.values
+        self.values = []
+        return values
+
+    def close(self) -> list:
+        self.check_open()
+        self.closed = True
+        for token in self.lexer.close():
+            self.push(token)
+
+        if self.stack:
+            raise Exception('Unexpected end of input at index {}'.format(self.pointer + 1))
+
+        return self.take()
+
+async def read_chunks(reader) -> AsyncIterator[bytes]:
+    while chunk := await reader.read(FEED_SIZE):
+        yield chunk
+
+async def iter_values(source) -> AsyncIterator:
+    # Yields every top-level value of an `asyncio.StreamReader` (or anything
+    # with an async `read`) or of an async iterator of str or bytes chunks,
+    # as soon as the chunk that completes it has arrived. Values that were
+    # finished before an error are still yielded before it is raised.
+    chunks = read_chunks(source) if hasattr(source, 'read') else source
+    parser = StreamParser()
+
+    async for chunk in chunks:
+        for start in range(0, len(chunk), FEED_SIZE):
+            try:
+                parser.feed(chunk[start:start + FEED_SIZE])
+            except Exception:
+                for value in parser.take():
+                    yield value
+                raise
+            for value in parser.take():
+                yield value
+            await asyncio.sleep(0)
+
+    for value in parser.close():
+        yield value
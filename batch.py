@@ -0,0 +1,82 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Iterable, Iterator
+from cache import LRUCache
+from parser import Parser, KEY_CACHE_SIZE
+
+EXECUTORS = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+
+def parse_chunk(documents: list, max_depth: int | None = None) -> list:
+    # Runs in a worker. Documents of one batch mostly share their keys, so
+    # they share a key cache. A document that fails to parse gives its
+    # exception in place of its value.
+    key_cache = LRUCache(KEY_CACHE_SIZE)
+    results = []
+    for document in documents:
+        try:
+            results.append(Parser(document, max_depth=max_depth, key_cache=key_cache).json)
+        except Exception as error:
+            results.append(error)
+    return results
+
+def chunks(documents: Iterable, chunksize: int) -> Iterator[list]:
+    documents = iter(documents)
+    while chunk := list(islice(documents, chunksize)):
+        yield chunk
+
+def parse_many(documents: Iterable[str | bytes], executor: str | Executor = 'serial', chunksize: int = 256, workers: int | None = None, max_depth: int | None = None) -> Iterator:
+    # Yields, in input order, the parsed value of every document, or the
+    # exception it raised, so one bad document does not stop the rest.
+    #
+    # `executor` is 'serial', 'process', 'thread' or an executor to reuse
+    # across calls, which saves starting a new pool each time. Documents go
+    # to the workers in lists of `chunksize`, so the cost of pickling and
+    # of each round trip is paid per chunk rather than per document. The
+    # thread pool only runs parsers in parallel on free-threaded Python.
+    if executor == 'serial':
+        for chunk in chunks(documents, chunksize):
+            yield from parse_chunk(chunk, max_depth)
+        return
+
+    if isinstance(executor, Executor):
+        yield from submit_chunks(executor, documents, chunksize, workers or os.cpu_count() or 1, max_depth)
+        return
+
+    if executor not in EXECUTORS:
+        raise Exception("Unknown executor '{}', expected 'serial', 'process' or 'thread'".format(executor))
+    workers = workers or os.cpu_count() or 1
+    with EXECUTORS[executor](workers) as pool:
+        yield from submit_chunks(pool, documents, chunksize, workers, max_depth)
+
+def submit_chunks(executor: Executor, documents: Iterable, chunksize: int, workers: int, max_depth: int | None) -> Iterator:
+    tasks = (executor.submit(parse_chunk, chunk, max_depth) for chunk in chunks(documents, chunksize))
+    return bounded_results(tasks, workers * 2)
+
+def bounded_results(tasks: Iterable[Future], limit: int, ordered: bool = True) -> Iterator:
+    # Yields the items each task's result holds, in the order the tasks were
+    # submitted or, unless `ordered`, as each one finishes. Tasks are taken
+    # from `tasks` (which submits them) only while fewer than `limit` are in
+    # flight, so results for a large input are not all held in memory at
+    # once. Tasks still in flight when iteration stops are cancelled.
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(task)
+            if len(pending) < limit:
+                continue
+
+            if ordered:
+                yield from pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield from future.result()
+
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,240 @@
+import argparse
+import io
+import json
+import random
+import string
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from lexer import Lexer
+from ndjson import read_ndjson
+from parser import Parser
+
+# Nesting stays inside the recursion limit of the stdlib json reference.
+NESTING_DEPTH = 200
+
+def random_string(rng: random.Random, length: int) -> str:
+    return ''.join(rng.choice(string.ascii_letters + string.digits + ' ') for _ in range(length))
+
+def random_number(rng: random.Random):
+    if rng.random() < 0.5:
+        return rng.randint(-10 ** 6, 10 ** 9)
+    return round(rng.uniform(-1e6, 1e6), rng.randint(0, 6))
+
+def random_record(rng: random.Random) -> dict:
+    return {
+        'id': rng.randint(0, 10 ** 9),
+        'name': random_string(rng, rng.randint(3, 20)),
+        'active': rng.random() < 0.5,
+        'score': random_number(rng),
+        'tags': [random_string(rng, 5) for _ in range(rng.randint(0, 4))],
+        'parent': None,
+    }
+
+def deep_nesting(rng: random.Random, size: int) -> str:
+    documents = []
+    total = 0
+    while total < size:
+        document = 'null'
+        for _ in range(NESTING_DEPTH):
+            document = '{"a": [%s, %d]}' % (document, rng.randint(0, 9))
+        documents.append(document)
+        total += len(document)
+    return '[' + ', '.join(documents) + ']'
+
+def wide_objects(rng: random.Random, size: int) -> str:
+    objects = []
+    total = 0
+    while total < size:
+        obj = {'key_%d' % i: random_number(rng) for i in range(1000)}
+        objects.append(json.dumps(obj))
+        total += len(objects[-1])
+    return '[' + ', '.join(objects) + ']'
+
+def long_strings(rng: random.Random, size: int) -> str:
+    values = []
+    total = 0
+    while total < size:
+        values.append(random_string(rng, rng.randint(1000, 10000)))
+        total += len(values[-1])
+    return json.dumps(values)
+
+def number_arrays(rng: random.Random, size: int) -> str:
+    values = []
+    total = 0
+    while total < size:
+        values.append(random_number(rng))
+        total += 12
+    return json.dumps(values)
+
+def pretty_printed(rng: random.Random, size: int) -> str:
+    records = []
+    total = 0
+    while total < size:
+        records.append(random_record(rng))
+        total += 200
+    return json.dumps({'records': records}, indent=8)
+
+def ndjson_lines(rng: random.Random, size: int) -> str:
+    lines = []
+    total = 0
+    while total < size:
+        lines.append(json.dumps(random_record(rng)))
+        total += len(lines[-1]) + 1
+    return '\n'.join(lines) + '\n'
+
+CORPORA = {
+    'deep_nesting': deep_nesting,
+    'wide_objects': wide_objects,
+    'long_strings': long_strings,
+    'number_arrays': number_arrays,
+    'pretty_printed': pretty_printed,
+    'ndjson': ndjson_lines,
+}
+
+def generate(name: str, size: int, seed: int = 0) -> str:
+    # Same name, size and seed always give the same document.
+    return CORPORA[name](random.Random(seed), size)
+
+def best_time(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_mb(function) -> float:
+    # The most memory a single run allocates on top of what was already held,
+    # such as the document. Traced apart from the timed runs, which tracing
+    # would slow down.
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def run_case(name: str, size: int, repeat: int) -> dict:
+    # Runs in a fresh process per case, so cases do not share caches or a
+    # heap.
+    document = generate(name, size)
+    data = document.encode('utf-8')
+
+    def tokenize():
+        Lexer(document).tokenize()
+
+    def stream():
+        for _ in Lexer(document).iter_tokens():
+            pass
+
+    if name == 'ndjson':
+        def parse():
+            list(read_ndjson(io.BytesIO(data)))
+
+        def reference():
+            [json.loads(line) for line in data.splitlines()]
+    else:
+        def parse():
+            Parser(document)
+
+        def reference():
+            json.loads(document)
+
+    lexer = Lexer(document)
+    lexer.tokenize()
+    tokens = len(lexer.tokens)
+    del lexer
+
+    stages = {}
+    for stage, function in (('tokenize', tokenize), ('stream', stream), ('parse', parse), ('json', reference)):
+        seconds = best_time(function, repeat)
+        stages[stage] = {
+            'seconds': seconds,
+            'mb_per_s': len(data) / seconds / 1e6,
+            'tokens_per_s': tokens / seconds,
+            'peak_mb': peak_mb(function),
+        }
+
+    return {
+        'bytes': len(data),
+        'tokens': tokens,
+        'stages': stages,
+    }
+
+def run(cases: list[str], size: int, repeat: int) -> dict:
+    results = {}
+    for name in cases:
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+            results[name] = executor.submit(run_case, name, size, repeat).result()
+    return {
+        'python': sys.version.split()[0],
+        'size': size,
+        'repeat': repeat,
+        'cases': results,
+    }
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # Every stage other than the stdlib reference that got slower than the
+    # baseline, or whose peak memory grew, by more than `threshold` (a
+    # fraction, e.g. 0.1 for 10%).
+    found = []
+    for name, case in results['cases'].items():
+        for stage, timing in case['stages'].items():
+            before = baseline.get('cases', {}).get(name, {}).get('stages', {}).get(stage)
+            if stage == 'json' or before is None:
+                continue
+            if timing['mb_per_s'] < before['mb_per_s'] * (1 - threshold):
+                found.append('{}/{}: {:.3f} MB/s, baseline {:.3f} MB/s'.format(name, stage, timing['mb_per_s'], before['mb_per_s']))
+            # Baselines saved before memory was measured per stage have none.
+            if 'peak_mb' in timing and 'peak_mb' in before and timing['peak_mb'] > before['peak_mb'] * (1 + threshold):
+                found.append('{}/{}: {:.1f} MB peak, baseline {:.1f} MB peak'.format(name, stage, timing['peak_mb'], before['peak_mb']))
+    return found
+
+def report(results: dict) -> None:
+    print('{:<16} {:>10} {:>10} {:>10} {:>10} {:>10} {:>12} {:>10}'.format(
+        'case', 'MB', 'tokenize', 'stream', 'parse', 'json', 'tokens/s', 'parse MB'))
+    for name, case in results['cases'].items():
+        stages = case['stages']
+        print('{:<16} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.0f} {:>10.1f}'.format(
+            name,
+            case['bytes'] / 1e6,
+            stages['tokenize']['mb_per_s'],
+            stages['stream']['mb_per_s'],
+            stages['parse']['mb_per_s'],
+            stages['json']['mb_per_s'],
+            stages['parse']['tokens_per_s'],
+            stages['parse']['peak_mb'],
+        ))
+
+def main(argv: list[str] | None = None) -> int:
+    arguments = argparse.ArgumentParser(description='Benchmark the lexer and parser on generated corpora (throughput in MB/s).')
+    arguments.add_argument('--cases', nargs='+', choices=list(CORPORA), default=list(CORPORA))
+    arguments.add_argument('--size', type=float, default=0.5, help='approximate size of each document in MB')
+    arguments.add_argument('--repeat', type=int, default=3, help='runs per stage; the best is kept')
+    arguments.add_argument('--output', help='write results to this JSON file')
+    arguments.add_argument('--baseline', help='compare against results from an earlier run')
+    arguments.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown against the baseline, as a fraction')
+    options = arguments.parse_args(argv)
+
+    results = run(options.cases, int(options.size * 1e6), options.repeat)
+    report(results)
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            found = regressions(results, json.load(file), options.threshold)
+        for regression in found:
+            print('Regression: ' + regression)
+        if found:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+class LRUCache:
+    # A mapping bounded to `max_size` entries and, when `max_bytes` is set,
+    # to that many bytes in total as given by the size of each entry passed
+    # to `put`. Adding an entry evicts the ones used least recently until
+    # both limits hold again.
+    def __init__(self, max_size: int, max_bytes: int | None = None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.sizes: dict = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def get(self, key, default=None):
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value, size: int = 0) -> None:
+        # An entry that could never fit is not kept at all, rather than
+        # evicting everything else first.
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        entries = self.entries
+        if key in entries:
+            self.bytes -= self.sizes.pop(key, 0)
+        entries[key] = value
+        entries.move_to_end(key)
+        if size:
+            self.sizes[key] = size
+            self.bytes += size
+
+        while len(entries) > self.max_size or self.max_bytes is not None and self.bytes > self.max_bytes:
+            evicted, _ = entries.popitem(last=False)
+            self.bytes -= self.sizes.pop(evicted, 0)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.sizes.clear()
+        self.bytes = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
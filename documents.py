@@ -0,0 +1,91 @@
+import mmap
+import os
+import re
+from typing import Iterator
+from cache import LRUCache
+from lexer import Lexer, TokenType, GROUP_TYPES, NUMBER, INVALID_NUMBER, check_number
+from parser import Parser, KEY_CACHE_SIZE
+from query import scalar_value
+from sourcemap import LineIndex
+
+# Where reading starts over after a corrupt document: the start of the next
+# line that opens an object or array in its first column. Top-level values
+# of a log begin there, while the members of a pretty-printed one are
+# indented.
+TEXT_BOUNDARY = re.compile(r'\n(?=[\[{])')
+BUFFER_BOUNDARY = re.compile(rb'\n(?=[\[{])')
+
+def iter_documents(input: str | bytes, offset: int = 0, skip_errors: bool = False, max_depth: int | None = None) -> Iterator[tuple]:
+    # Yields (value, end) for every top-level value of concatenated JSON,
+    # whether written back to back or separated by whitespace or newlines,
+    # starting at `offset`. A value may also be a string, number or literal;
+    # a number counts as written only once something follows it.
+    # `end` is the offset just past the value (bytes for bytes-like input,
+    # characters for str), so reading can later be resumed from it without
+    # going over the values before it again.
+    # With `skip_errors`, a document that fails to parse is yielded as
+    # (exception, end) instead, where `end` is the next boundary, and reading
+    # goes on from there. If no boundary follows, the document may just not
+    # have been written in full yet, so its error is raised: the last `end`
+    # yielded is then still the offset to resume from.
+    lexer = Lexer(input)
+    whitespace = lexer.whitespace.match
+    boundary = BUFFER_BOUNDARY if lexer.is_buffer else TEXT_BOUNDARY
+    # Shared by the documents, as each one gets a parser of its own.
+    key_cache = LRUCache(KEY_CACHE_SIZE)
+    line_index = lexer.line_index
+    position = offset
+
+    while True:
+        position = whitespace(input, position).end()
+        if position == lexer.length:
+            return
+
+        try:
+            value, end = read_document(lexer, position, key_cache, line_index, max_depth)
+        except Exception as error:
+            if not skip_errors:
+                raise
+            found = boundary.search(input, position)
+            if found is None:
+                raise
+            position = found.end()
+            yield error, position
+            continue
+
+        position = end
+        yield value, end
+
+def read_document(lexer: Lexer, position: int, key_cache: LRUCache, line_index: LineIndex, max_depth: int | None) -> tuple:
+    input = lexer.input
+    found = lexer.pattern.match(input, position)
+    if found is None:
+        lexer.check_end(position)
+
+    kind = found.lastindex
+    token_type = GROUP_TYPES[kind]
+    if token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+        parser = Parser(input, max_depth=max_depth, key_cache=key_cache, start=position, line_index=line_index, check_end=False)
+        return parser.json, parser.lexer.span()[1]
+
+    if (kind == NUMBER or kind == INVALID_NUMBER) and found.end() == lexer.length:
+        # More digits may still be appended to a number that runs into the
+        # end of the input, like to an unterminated string.
+        raise Exception('Unexpected end of input at index 1 {}'.format(line_index.describe(lexer.length)))
+    if kind == INVALID_NUMBER:
+        check_number(lexer.chars(*found.span(INVALID_NUMBER)), found.start(INVALID_NUMBER), line_index)
+    if token_type in (TokenType.JSON_CLOSE_BRACE, TokenType.JSON_CLOSE_BRACKET, TokenType.JSON_COLON, TokenType.JSON_COMMA):
+        raise Exception("Unexpected token '{}' at index 0 {}".format(token_type.value, line_index.describe(found.start(kind))))
+    return scalar_value(lexer, found), found.end()
+
+def iter_file_documents(path: str, offset: int = 0, skip_errors: bool = False, max_depth: int | None = None) -> Iterator[tuple]:
+    # `iter_documents` over a file mapped into memory, as `parse_file` does.
+    # Offsets are in bytes. Only what the file held when it was opened is
+    # read; resume from the last offset to pick up what was appended since.
+    with open(path, 'rb') as file:
+        # An empty file cannot be mapped.
+        if not os.fstat(file.fileno()).st_size:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from iter_documents(buffer, offset, skip_errors, max_depth)
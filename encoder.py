@@ -0,0 +1,125 @@
+import io
+import math
+import re
+from array import array
+from collections.abc import Mapping
+from typing import Iterator
+
+# Characters a JSON string cannot hold as they are. Lone surrogates, which
+# `Parser` gives for escapes like "\ud800", are written back as escapes so
+# that the output can always be encoded as UTF-8.
+ESCAPE = re.compile('["\\\\\x00-\x1f\ud800-\udfff]')
+ESCAPES = {'"': '\\"', '\\': '\\\\', '\b': '\\b', '\f': '\\f', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+# Output is handed to the file in pieces of about this many characters.
+CHUNK_SIZE = 1 << 16
+
+DONE = object()
+
+def escape(found: re.Match) -> str:
+    char = found.group()
+    return ESCAPES.get(char) or '\\u{:04x}'.format(ord(char))
+
+def encode_string(value: str) -> str:
+    if ESCAPE.search(value) is None:
+        return '"' + value + '"'
+    return '"' + ESCAPE.sub(escape, value) + '"'
+
+def iter_encode(value, indent: int | None = None, sort_keys: bool = False) -> Iterator[str]:
+    # Yields the JSON text of `value` in small pieces. Containers are walked
+    # on an explicit stack like the parser does, so any depth the parser
+    # accepts can be written back. Objects are dicts or any other mapping,
+    # and named tuples (records); arrays are lists, other tuples and typed
+    # arrays.
+    colon = ':' if indent is None else ': '
+    # One [members left, is_object, is_first] frame per open container.
+    stack = []
+
+    while True:
+        if type(value) is str:
+            yield encode_string(value)
+        elif value is None:
+            yield 'null'
+        elif value is True:
+            yield 'true'
+        elif value is False:
+            yield 'false'
+        elif isinstance(value, int):
+            yield int.__repr__(value)
+        elif isinstance(value, float):
+            if not math.isfinite(value):
+                raise Exception('Cannot write {} as JSON'.format(value))
+            yield float.__repr__(value)
+        elif isinstance(value, str):
+            yield encode_string(value)
+        else:
+            if isinstance(value, Mapping):
+                members, is_object = value.items(), True
+            elif isinstance(value, tuple) and hasattr(value, '_fields'):
+                members, is_object = zip(value._fields, value), True
+            elif isinstance(value, (list, tuple, array)):
+                members, is_object = value, False
+            else:
+                raise Exception('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+            if is_object and sort_keys:
+                members = sorted(members, key=lambda member: member[0])
+            stack.append([iter(members), is_object, True])
+            yield '{' if is_object else '['
+
+        # Move on to the next value, closing every container that has none left.
+        while stack:
+            frame = stack[-1]
+            members, is_object, is_first = frame
+            value = next(members, DONE)
+
+            if value is DONE:
+                stack.pop()
+                if indent is not None and not is_first:
+                    yield '\n' + ' ' * (indent * len(stack))
+                yield '}' if is_object else ']'
+                continue
+
+            frame[2] = False
+            if not is_first:
+                yield ','
+            if indent is not None:
+                yield '\n' + ' ' * (indent * len(stack))
+            if is_object:
+                key, value = value
+                if not isinstance(key, str):
+                    raise Exception('Keys must be strings, got {}'.format(type(key).__name__))
+                yield encode_string(key) + colon
+            break
+        else:
+            return
+
+def dumps(value, indent: int | None = None, sort_keys: bool = False) -> str:
+    # Compact by default; `indent` spaces per level puts every member on a
+    # line of its own.
+    return ''.join(iter_encode(value, indent, sort_keys))
+
+def dump(value, file, indent: int | None = None, sort_keys: bool = False) -> None:
+    # Writes to a text file, a binary file or `io.BytesIO` (as UTF-8), or
+    # appends to a `bytearray`, in chunks of about CHUNK_SIZE characters,
+    # so the whole output is never built up as one string.
+    if isinstance(file, bytearray):
+        write = file.extend
+    else:
+        write = file.write
+    is_text = isinstance(file, io.TextIOBase)
+
+    pieces = []
+    size = 0
+    for piece in iter_encode(value, indent, sort_keys):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            chunk = ''.join(pieces)
+            write(chunk if is_text else chunk.encode('utf-8'))
+            pieces.clear()
+            size = 0
+
+    if pieces:
+        chunk = ''.join(pieces)
+        write(chunk if is_text else chunk.encode('utf-8'))
@@ -0,0 +1,124 @@
+from typing import Iterator
+from lexer import Lexer, TokenType
+from parser import OBJECT_STATES, ARRAY_STATES, token_group, to_number
+
+SCALAR_EVENTS = {
+    TokenType.JSON_STRING: 'string',
+    TokenType.JSON_NUMBER: 'number',
+    TokenType.JSON_BOOL_TRUE: 'boolean',
+    TokenType.JSON_BOOL_FALSE: 'boolean',
+    TokenType.JSON_NULL: 'null',
+}
+
+def join_path(prefix: str, name: str) -> str:
+    return prefix + '.' + name if prefix else name
+
+def iter_events(input: str) -> Iterator[tuple[str, str, object]]:
+    # Yields (prefix, event, value) tuples. The prefix is the dotted path of
+    # the value the event belongs to: object keys are joined with '.', and
+    # every array element is named 'item', e.g. 'items.item.price'.
+    # One [is_object, state, prefix, child_prefix] frame per open container.
+    stack: list[list] = []
+    pointer = -1
+    tokens = Lexer(input).iter_tokens()
+
+    for token in tokens:
+        pointer += 1
+
+        if token.type == TokenType.JSON_QUOTE:
+            continue
+
+        if not stack:
+            if token.type == TokenType.JSON_OPEN_BRACE:
+                stack.append([True, 1, '', None])
+                yield '', 'start_map', None
+            elif token.type == TokenType.JSON_OPEN_BRACKET:
+                stack.append([False, 1, '', 'item'])
+                yield '', 'start_array', None
+            else:
+                raise Exception(f"Unexpected token '{token.value}' at index {pointer}")
+            continue
+
+        frame = stack[-1]
+        is_object, current_state, prefix, child_prefix = frame
+        states = OBJECT_STATES if is_object else ARRAY_STATES
+        group = token_group(token, is_object, current_state)
+
+        if group not in states[current_state]:
+            raise Exception(f"Unexpected token '{token.value}' at index {pointer}")
+
+        frame[1] = states[current_state][group]
+
+        match group:
+            case 'key':
+                frame[3] = join_path(prefix, token.value)
+                yield prefix, 'map_key', token.value
+            case 'close_brace' | 'close_bracket':
+                stack.pop()
+                yield prefix, 'end_map' if is_object else 'end_array', None
+                # Like `Parser`, anything after the top-level value is not
+                # parsed, but it must still lex.
+                if not stack:
+                    for _ in tokens:
+                        pass
+                    return
+            case 'value' if token.type == TokenType.JSON_OPEN_BRACE:
+                stack.append([True, 1, child_prefix, None])
+                yield child_prefix, 'start_map', None
+            case 'value' if token.type == TokenType.JSON_OPEN_BRACKET:
+                stack.append([False, 1, child_prefix, join_path(child_prefix, 'item')])
+                yield child_prefix, 'start_array', None
+            case 'value' if token.type == TokenType.JSON_NUMBER:
+                yield child_prefix, 'number', to_number(token.value)
+            case 'value':
+                yield child_prefix, SCALAR_EVENTS[token.type], token.value
+
+    if pointer == -1:
+        raise Exception("Input should either have an object or an array.")
+    raise Exception('Unexpected end of input at index {}'.format(pointer))
+
+def build(event: str, events: Iterator[tuple[str, str, object]]):
+    # Builds the container opened by `event` from the events that follow it.
+    root = {} if event == 'start_map' else []
+    # One [container, key] frame per open container.
+    stack = [[root, None]]
+
+    for _, event, value in events:
+        frame = stack[-1]
+
+        match event:
+            case 'map_key':
+                frame[1] = value
+                continue
+            case 'end_map' | 'end_array':
+                stack.pop()
+                if not stack:
+                    return root
+                continue
+            case 'start_map':
+                value = {}
+            case 'start_array':
+                value = []
+
+        container, key = frame
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+
+        if event in ('start_map', 'start_array'):
+            stack.append([value, None])
+
+def items(input: str, prefix: str) -> Iterator:
+    # Yields every value found at `prefix`, building Python objects only for
+    # those subtrees. Everything else is checked and skipped as events.
+    events = iter_events(input)
+
+    for current, event, value in events:
+        if current != prefix:
+            continue
+
+        if event in ('start_map', 'start_array'):
+            yield build(event, events)
+        elif event not in ('map_key', 'end_map', 'end_array'):
+            yield value
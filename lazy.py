@@ -0,0 +1,251 @@
+import re
+from array import array
+from lexer import Lexer, TokenType
+from parser import Parser, to_number
+
+# Stage 1 matches every structural character and every string, so quotes,
+# braces and commas inside strings are stepped over. Whitespace and the
+# text of numbers and literals never produce a match and are skipped in
+# bulk by the regex engine. Strings are matched like the lexer does.
+STRUCTURAL_PATTERN = r'[{}\[\]:,]|"[^"]*(?<!\\)"|"[^"\\]*(?:\\[\s\S][^"\\]*)*"'
+TEXT_STRUCTURAL = re.compile(STRUCTURAL_PATTERN)
+BUFFER_STRUCTURAL = re.compile(STRUCTURAL_PATTERN.encode('ascii'))
+BRACKETS = re.compile(r'[{}\[\]]')
+TEXT_WHITESPACE = re.compile(r'[ \t\n\r]*')
+BUFFER_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+
+class StructuralIndex:
+    # Positions of `{ } [ ] : ,` and of the opening quote of every string,
+    # in order, with the character found at each (`kinds`, one per entry).
+    # `closes` holds, for every entry that opens an object or array, the
+    # entry that closes it, so a whole subtree can be skipped in one step.
+    def __init__(self, input: str | bytes):
+        is_buffer = not isinstance(input, str)
+        pattern = BUFFER_STRUCTURAL if is_buffer else TEXT_STRUCTURAL
+        offset_code = 'I' if len(input) < 2 ** 32 else 'Q'
+
+        self.positions = array(offset_code, map(re.Match.start, pattern.finditer(input)))
+        if is_buffer:
+            self.kinds = bytes(map(input.__getitem__, self.positions)).decode('ascii')
+        else:
+            self.kinds = ''.join(map(input.__getitem__, self.positions))
+
+        kinds = self.kinds
+        self.closes = array(offset_code, bytes(self.positions.itemsize * len(kinds)))
+        stack = []
+        for found in BRACKETS.finditer(kinds):
+            entry = found.start()
+            kind = kinds[entry]
+            if kind == '{' or kind == '[':
+                stack.append(entry)
+            elif not stack or kinds[stack[-1]] != ('{' if kind == '}' else '['):
+                raise Exception('Unexpected character \'{}\' at index {}'.format(kind, self.positions[entry]))
+            else:
+                self.closes[stack.pop()] = entry
+
+        if stack:
+            raise Exception('Unexpected end of input at index {}'.format(len(input)))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+class LazyDocument:
+    # A document that is only indexed up front (see StructuralIndex). Looking
+    # up `doc["a"]["b"][3]` walks just the containers on that path, jumping
+    # over the subtrees of every other member, and materializes only the
+    # value it ends at. Objects and arrays come back as lazy views; call
+    # `materialize()` on one to parse it in full. Values that are never
+    # looked at are never validated beyond their brackets and strings, and
+    # errors found while materializing a value give indexes within it.
+    def __init__(self, input: str | bytes):
+        self.input = input
+        self.is_buffer = not isinstance(input, str)
+        self.index = StructuralIndex(input)
+        # Views already handed out, by entry, so each container is walked once.
+        self.views: dict = {}
+
+        whitespace = BUFFER_WHITESPACE if self.is_buffer else TEXT_WHITESPACE
+        start = whitespace.match(input).end()
+        if not len(self.index) or self.index.positions[0] != start or self.index.kinds[0] not in '{[':
+            raise Exception("Input should either have an object or an array.")
+        self.root = self.view(0)
+
+    def view(self, entry: int):
+        view = self.views.get(entry)
+        if view is None:
+            view = LazyObject(self, entry) if self.index.kinds[entry] == '{' else LazyArray(self, entry)
+            self.views[entry] = view
+        return view
+
+    def value(self, entry: int, start: int, end: int):
+        # The value between two input offsets. `entry` is its index entry if
+        # it is an object or array, and -1 otherwise.
+        if entry >= 0:
+            return self.view(entry)
+
+        text = self.input[start:end]
+        tokens = list(Lexer(text))
+        if len(tokens) == 3 and tokens[0].type is TokenType.JSON_QUOTE:
+            value = tokens[1].value
+            return value.decode('utf-8') if type(value) is not str else value
+        if len(tokens) == 1 and tokens[0].type is TokenType.JSON_NUMBER:
+            return to_number(tokens[0].value)
+        if len(tokens) == 1 and tokens[0].type in (TokenType.JSON_BOOL_TRUE, TokenType.JSON_BOOL_FALSE, TokenType.JSON_NULL):
+            return tokens[0].value
+        if not tokens:
+            raise Exception('Missing value at index {}'.format(start))
+        raise Exception('Unexpected token \'{}\' at index {}'.format(tokens[-1].value, start))
+
+    def error(self, entry: int) -> Exception:
+        return Exception('Unexpected character \'{}\' at index {}'.format(self.index.kinds[entry], self.index.positions[entry]))
+
+    def __getitem__(self, key):
+        return self.root[key]
+
+    def __len__(self) -> int:
+        return len(self.root)
+
+    def __iter__(self):
+        return iter(self.root)
+
+    def __contains__(self, key) -> bool:
+        return key in self.root
+
+    # Only for an object document, like on `LazyObject`.
+    def get(self, key: str, default=None):
+        return self.root.get(key, default)
+
+    def keys(self):
+        return self.root.keys()
+
+    def materialize(self):
+        return self.root.materialize()
+
+class LazyContainer:
+    def __init__(self, document: LazyDocument, entry: int):
+        self.document = document
+        self.entry = entry
+        self.close = document.index.closes[entry]
+
+    def is_empty(self) -> bool:
+        # Only whitespace between the brackets. Anything else there with no
+        # entry in between is a lone scalar, which the walk then handles.
+        index = self.document.index
+        if self.close != self.entry + 1:
+            return False
+        return not self.document.input[index.positions[self.entry] + 1:index.positions[self.close]].strip()
+
+    def member(self, k: int) -> tuple[int, int, int, int]:
+        # The member value that starts after entry `k` (a colon, comma or
+        # opening bracket): its (entry or -1, start, end) and the entry right
+        # after it, which must be a comma or the closing bracket.
+        index = self.document.index
+        kinds = index.kinds
+        positions = index.positions
+        next_entry = k + 1
+        kind = kinds[next_entry]
+
+        if kind == '{' or kind == '[':
+            after = index.closes[next_entry] + 1
+            return next_entry, positions[next_entry], positions[after - 1] + 1, after
+        if kind == '"':
+            return -1, positions[next_entry], positions[next_entry + 1], next_entry + 1
+        return -1, positions[k] + 1, positions[next_entry], next_entry
+
+    def materialize(self):
+        index = self.document.index
+        start = index.positions[self.entry]
+        end = index.positions[self.close] + 1
+        return Parser(self.document.input[start:end]).json
+
+class LazyObject(LazyContainer):
+    def __init__(self, document: LazyDocument, entry: int):
+        super().__init__(document, entry)
+        # Key -> (entry or -1, start, end) of its value, built on first use.
+        self.members: dict | None = None
+
+    def load(self) -> dict:
+        if self.members is not None:
+            return self.members
+
+        document = self.document
+        kinds = document.index.kinds
+        positions = document.index.positions
+        members = {}
+        k = self.entry
+
+        while not self.is_empty():
+            # k is the opening brace or the comma before this member.
+            if kinds[k + 1] != '"':
+                raise document.error(k + 1)
+            if kinds[k + 2] != ':':
+                raise document.error(k + 2)
+            key = document.value(-1, positions[k + 1], positions[k + 2])
+            entry, start, end, k = self.member(k + 2)
+            members[key] = (entry, start, end)
+
+            if k == self.close:
+                break
+            if kinds[k] != ',':
+                raise document.error(k)
+
+        self.members = members
+        return members
+
+    def __getitem__(self, key: str):
+        return self.document.value(*self.load()[key])
+
+    def get(self, key: str, default=None):
+        if key not in self.load():
+            return default
+        return self[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.load()
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def keys(self):
+        return self.load().keys()
+
+class LazyArray(LazyContainer):
+    def __init__(self, document: LazyDocument, entry: int):
+        super().__init__(document, entry)
+        # (entry or -1, start, end) of every element, built on first use.
+        self.elements: list | None = None
+
+    def load(self) -> list:
+        if self.elements is not None:
+            return self.elements
+
+        document = self.document
+        kinds = document.index.kinds
+        elements = []
+        k = self.entry
+
+        while not self.is_empty():
+            # k is the opening bracket or the comma before this element.
+            entry, start, end, k = self.member(k)
+            elements.append((entry, start, end))
+
+            if k == self.close:
+                break
+            if kinds[k] != ',':
+                raise document.error(k)
+
+        self.elements = elements
+        return elements
+
+    def __getitem__(self, position: int):
+        return self.document.value(*self.load()[position])
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+    def __iter__(self):
+        for element in self.load():
+            yield self.document.value(*element)
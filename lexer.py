@@ -1,5 +1,9 @@
-from collections import deque
+import codecs
+import re
+from array import array
 from enum import Enum
+from typing import Iterator
+from sourcemap import LineIndex
 
 class TokenType(Enum):
     JSON_OPEN_BRACE = '{'
@@ -11,6 +15,8 @@ class TokenType(Enum):
     JSON_COMMA = ','
     JSON_NUMBER = 'NUMBER'
     JSON_STRING = 'STRING'
+    # A whole array of numbers, only produced when the lexer is asked for it.
+    JSON_NUMBER_ARRAY = 'NUMBER_ARRAY'
     JSON_NULL = None
     JSON_BOOL_TRUE = True
     JSON_BOOL_FALSE = False
@@ -19,7 +25,14 @@ class TokenType(Enum):
     JSON_LINEFEED = '\n'
     JSON_TAB = '\t'
 
+    # Members are singletons compared by identity, so hash them the same way
+    # instead of through Enum's Python-level __hash__; the parser looks
+    # token types up in dicts for every token.
+    __hash__ = object.__hash__
+
 class Token:
+    __slots__ = ('type', 'value')
+
     def __init__(self, type: TokenType, value=None):
         self.type = type
         self.value = value
@@ -29,93 +42,562 @@ class Token:
     def __repr__(self) -> str:
         return "Token(type={}, value={})".format(self.type, self.value)
 
+JSON_LITERALS = ('null', 'true', 'false')
+
+# One match of the token pattern per token: the whitespace in front of it
+# (group 1), then one group per kind of token, so the number of the group
+# that matched (`lastindex`) says what was found. String bodies are skipped
+# in bulk: STRING runs straight to the next quote, which ends the string
+# unless a backslash comes right before it. Only then does matching fall
+# through to the slower ESCAPED_STRING, which steps over escapes one by one.
+# A STRING body can still hold escapes such as \n, so the lexer checks it
+# for a backslash before using it as is. Numbers are checked against the
+# full JSON grammar in the same match; a run of number characters that does
+# not form a valid number falls through to INVALID_NUMBER.
+TOKEN_PATTERN = r"""([ \t\n\r]*)(?:
+    (\{)|(\})|(\[)|(\])|(:)|(,)
+    |"([^"]*)(?<!\\)"
+    |"([^"\\]*(?:\\[\s\S][^"\\]*)*)"
+    |(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)(?![-+0-9.eE])
+    |([-0-9][-+0-9.eE]*)
+    |(null)|(true)|(false)
+)"""
+TEXT_TOKEN = re.compile(TOKEN_PATTERN, re.VERBOSE)
+BUFFER_TOKEN = re.compile(TOKEN_PATTERN.encode('ascii'), re.VERBOSE)
+TEXT_WHITESPACE = re.compile(r'[ \t\n\r]*')
+BUFFER_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+
+# The rest of an array that holds nothing but numbers, matched right after
+# its opening bracket: the first number, then runs of `, number` taken one
+# match at a time, then the closing bracket. The regex engine keeps state
+# for every repetition until a match ends, so runs are capped at
+# NUMBER_RUN_LENGTH numbers and memory stays flat however long the array is.
+NUMBER_RUN_LENGTH = 4096
+NUMBER_ARRAY_PATTERNS = tuple(pattern.format(number=r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?', length=NUMBER_RUN_LENGTH) for pattern in (
+    r'[ \t\n\r]*{number}',
+    r'(?:[ \t\n\r]*,[ \t\n\r]*{number}){{0,{length}}}',
+    r'[ \t\n\r]*\]',
+))
+TEXT_NUMBER_ARRAY = tuple(map(re.compile, NUMBER_ARRAY_PATTERNS))
+BUFFER_NUMBER_ARRAY = tuple(re.compile(pattern.encode('ascii')) for pattern in NUMBER_ARRAY_PATTERNS)
+
+# For telling whether a chunk of incremental input ends a string or number
+# that started before it: the body of a string up to its end quote, and the
+# characters a number can go on with.
+STRING_BODY = re.compile(r'[^"\\]*(?:\\[\s\S][^"\\]*)*')
+NUMBER_START = set('-0123456789')
+NUMBER_CHARS = re.compile(r'[-+0-9.eE]*')
+
+OPEN_BRACKET = 4
+STRING = 8
+ESCAPED_STRING = 9
+NUMBER = 10
+INVALID_NUMBER = 11
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+# A backslash and what follows it: a surrogate pair, any other \uXXXX, or a
+# single character, which must then be one of ESCAPES.
+ESCAPE_SEQUENCE = re.compile(r'\\(?:u([dD][89abAB][0-9a-fA-F]{2})\\u([dD][c-fC-F][0-9a-fA-F]{2})|u([0-9a-fA-F]{4})|(.?))', re.DOTALL)
+
+# Tokens without a value of their own are shared rather than created per
+# occurrence, and looked up by the number of the group that matched them.
+SHARED_TOKENS = {token_type: Token(token_type) for token_type in TokenType if token_type not in (TokenType.JSON_NUMBER, TokenType.JSON_STRING, TokenType.JSON_NUMBER_ARRAY)}
+QUOTE_TOKEN = SHARED_TOKENS[TokenType.JSON_QUOTE]
+GROUP_TOKENS = tuple(SHARED_TOKENS.get(token_type) for token_type in (
+    None,
+    None,
+    TokenType.JSON_OPEN_BRACE,
+    TokenType.JSON_CLOSE_BRACE,
+    TokenType.JSON_OPEN_BRACKET,
+    TokenType.JSON_CLOSE_BRACKET,
+    TokenType.JSON_COLON,
+    TokenType.JSON_COMMA,
+    None,
+    None,
+    None,
+    None,
+    TokenType.JSON_NULL,
+    TokenType.JSON_BOOL_TRUE,
+    TokenType.JSON_BOOL_FALSE,
+))
+# The token type each group stands for.
+GROUP_TYPES = tuple(
+    TokenType.JSON_STRING if kind in (STRING, ESCAPED_STRING)
+    else TokenType.JSON_NUMBER if kind in (NUMBER, INVALID_NUMBER)
+    else token.type if token is not None
+    else None
+    for kind, token in enumerate(GROUP_TOKENS)
+)
+# Keyed by both the character, as seen when indexing a str, and its code,
+# as seen when indexing bytes.
+WHITESPACE_TOKENS = {}
+for token_type in (TokenType.JSON_SPACE, TokenType.JSON_CARRIAGE_RETURN, TokenType.JSON_LINEFEED, TokenType.JSON_TAB):
+    WHITESPACE_TOKENS[token_type.value] = WHITESPACE_TOKENS[ord(token_type.value)] = SHARED_TOKENS[token_type]
+
+# Compact one-byte codes for token types, as kept by TokenStore.
+TOKEN_TYPES = list(TokenType)
+TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+GROUP_CODES = tuple(TYPE_CODES[token.type] if token is not None else None for token in GROUP_TOKENS)
+WHITESPACE_CODES = {char: TYPE_CODES[token.type] for char, token in WHITESPACE_TOKENS.items()}
+QUOTE_CODE = TYPE_CODES[TokenType.JSON_QUOTE]
+STRING_CODE = TYPE_CODES[TokenType.JSON_STRING]
+NUMBER_CODE = TYPE_CODES[TokenType.JSON_NUMBER]
+
+def located(message: str, offset: int, line_index: LineIndex | None) -> Exception:
+    # `message` followed by the line and column of `offset`, as in
+    # `Parser.error`, when a line index of the input is at hand.
+    if line_index is None:
+        return Exception(message)
+    return Exception('{} {}'.format(message, line_index.describe(offset)))
+
+def check_number(token_value: str, start: int = 0, line_index: LineIndex | None = None) -> None:
+    # Only reached for runs of number characters the token pattern rejected;
+    # walks them through the number DFA to report where they go wrong.
+    # Indexes in errors are within the number; `start` is where it begins in
+    # the input, for the line and column.
+    states = [
+        # State 0: Initial state
+        # If the character is a minus sign, transition to state 1
+        # If the character is '0', transition to state 2
+        # If the character is a digit between 1-9, transition to state 3
+        {'minus': 1, 'zero': 2, 'digits_1_to_9': 3},
+        
+        # State 1: After encountering a minus sign
+        # If the character is '0', transition to state 2
+        # If the character is a digit between 1-9, transition to state 3
+        {'zero': 2, 'digits_1_to_9': 3},
+        
+        # State 2: After encountering '0'
+        # If the character is a dot (.), transition to state 5 (start of a decimal part)
+        # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
+        {'dot': 5, 'exponent': 6},
+        
+        # State 3: After encountering a digit from 1-9
+        # If the character is a dot (.), transition to state 5 (start of a decimal part)
+        # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
+        # If the character is a digit (0-9), remain in state 4 (continue reading digits)
+        {'dot': 5, 'exponent': 6, 'digits_0_to_9': 4},
+        
+        # State 4: After encountering additional digits
+        # If the character is a digit (0-9), remain in state 4 (continue reading digits)
+        # If the character is a dot (.), transition to state 5 (start of decimal part)
+        # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
+        {'digits_0_to_9': 4, 'dot': 5, 'exponent': 6},
+    
+        # State 5: After encountering a dot (decimal point)
+        # If the character is a digit (0-9), transition to state 7 (start of the fractional part)
+        {'digits_0_to_9': 7},
+        
+        # State 6: After encountering an exponent ('e' or 'E')
+        # If the character is a sign ('+' or '-'), transition to state 8 (to handle the sign of the exponent)
+        # If the character is a digit (0-9), transition to state 9 (to start reading the exponent digits)
+        {'sign': 8, 'digits_0_to_9': 9},
+        
+        # State 7: After encountering digits in the fractional part
+        # If the character is a digit (0-9), remain in state 7 (continue reading the fractional part)
+        # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
+        {'digits_0_to_9': 7, 'exponent': 6},
+        
+        # State 8: After encountering a sign in the exponent part
+        # If the character is a digit (0-9), transition to state 9 (start reading the exponent digits)
+        {'digits_0_to_9': 9},
+        
+        # State 9: After encountering digits in the exponent part
+        # If the character is a digit (0-9), remain in state 9 (continue reading the exponent digits)
+        {'digits_0_to_9': 9}
+    ]
+
+    current_state = 0
+    i = 0
+    length = len(token_value)
+
+    while i < length:
+        char = token_value[i]
+
+        # Only in the initial two states, we need to check 'zero' and 'minus' states.
+        if current_state == 0 or current_state == 1:
+            if char == '0':
+                group = 'zero'
+            elif char in '123456789':
+                group = 'digits_1_to_9'
+            elif char == '-':
+                group = 'minus'
+            else:
+                raise located(f"Unexpected character '{char}' at index {i} for starting a number", start + i, line_index)
+        else:
+            if char in '0123456789':
+                group = 'digits_0_to_9'
+            elif char in '+-':
+                group = 'sign'
+            elif char in 'eE':
+                group = 'exponent'
+            else:
+                group = 'dot'
+        
+        if group not in states[current_state]:
+            raise located(f"Unexpected character '{char}' at index {i}", start + i, line_index)
+
+        current_state = states[current_state][group]
+        i += 1
+    
+    if current_state not in [2, 3, 4, 7, 9]:
+        raise located('Unexpected character \'{}\' at index {}'.format(token_value[i - 1], i - 1), start + i - 1, line_index)
+
+def unescape(value: str | bytes, start: int, line_index: LineIndex | None = None) -> str:
+    # Slow path for string bodies that contain a backslash. `start` is where
+    # the body begins in the input, for error messages.
+    is_buffer = not isinstance(value, str)
+    if is_buffer:
+        value = bytes(value).decode('utf-8')
+
+    chunks = []
+    i = 0
+    while True:
+        j = value.find('\\', i)
+        if j == -1:
+            chunks.append(value[i:])
+            return ''.join(chunks)
+        chunks.append(value[i:j])
+
+        found = ESCAPE_SEQUENCE.match(value, j)
+        high, low, code, char = found.groups()
+        if high is not None:
+            chunks.append(chr(0x10000 + (int(high, 16) - 0xd800 << 10) + int(low, 16) - 0xdc00))
+        elif code is not None:
+            # Lone surrogates are kept as they are, like the json module does.
+            chunks.append(chr(int(code, 16)))
+        elif char in ESCAPES:
+            chunks.append(ESCAPES[char])
+        else:
+            if is_buffer:
+                # Offsets into bytes-like input count bytes.
+                j = len(value[:j].encode('utf-8'))
+            raise located('Invalid escape \'{}\' at index {}'.format(found.group(), start + j), start + j, line_index)
+        i = found.end()
+
+class TokenStore:
+    # Tokens kept as parallel arrays: a one-byte type code plus start and end
+    # offsets into the source, instead of one Python object per token. Values
+    # are sliced out of the source only when a token is looked at.
+    def __init__(self, input: str | bytes):
+        offset_code = 'I' if len(input) < 2 ** 32 else 'Q'
+        self.input = input
+        self.types = array('B')
+        self.starts = array(offset_code)
+        self.ends = array(offset_code)
+        # Indexes of the few string tokens whose values hold escapes.
+        self.escaped: set[int] = set()
+
+    def append(self, code: int, start: int, end: int) -> None:
+        self.types.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        token_type = TOKEN_TYPES[self.types[index]]
+
+        if token_type in (TokenType.JSON_STRING, TokenType.JSON_NUMBER):
+            value = self.input[self.starts[index]:self.ends[index]]
+            if index in self.escaped:
+                value = unescape(value, self.starts[index])
+            return Token(token_type, value)
+        return SHARED_TOKENS[token_type]
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self)):
+            yield self[index]
+
 class Lexer:
-    def __init__(self, input: str):
-        self.tokens: list[Token] = []
+    def __init__(self, input: str | bytes, final: bool = True, number_arrays: bool = False, start: int = 0, line_index: LineIndex | None = None):
+        self.tokens = TokenStore(input)
         self.input = input
         self.length = len(input)
-    
+
+        # Gives errors their line and column. Line starts are only collected
+        # on the first error; pass a `line_index` to share them with a parser
+        # of the same input.
+        self.line_index = line_index if line_index is not None else LineIndex(input)
+
+        # Bytes-like input (bytes, bytearray, mmap) is scanned in place. String
+        # and number token values are then raw byte slices, decoded only when
+        # the parser materializes them.
+        self.is_buffer = not isinstance(input, str)
+        self.pattern = BUFFER_TOKEN if self.is_buffer else TEXT_TOKEN
+        self.whitespace = BUFFER_WHITESPACE if self.is_buffer else TEXT_WHITESPACE
+        self.backslash = b'\\' if self.is_buffer else '\\'
+
+        # When `final` is False the input is only a prefix of the document, so
+        # a token that runs into the end of the input may still be incomplete.
+        # Scanning then stops in front of it and `index` tells where to resume.
+        self.final = final
+        self.index = 0
+
+        # `iter_tokens` starts at this offset, so a value can be read out of
+        # the middle of a large input without slicing it off first.
+        self.start = start
+
+        # With `number_arrays`, `iter_tokens` hands out every array of only
+        # numbers as a single JSON_NUMBER_ARRAY token, whose value is the
+        # numbers converted in bulk into an array('q') of ints, or array('d')
+        # of floats if any of them has a fraction or exponent, along with the
+        # number of tokens it stands for.
+        self.number_arrays = (BUFFER_NUMBER_ARRAY if self.is_buffer else TEXT_NUMBER_ARRAY) if number_arrays else None
+        # Offset of the opening bracket of the last such array.
+        self.array_start = 0
+
+        # The match that produced the token `iter_tokens` handed out last,
+        # which `span` turns into source offsets.
+        self.found: re.Match | None = None
+
+    def __iter__(self) -> Iterator[Token]:
+        return self.iter_tokens()
+
     def tokenize(self) -> None:
-        i = 0
-
-        while i < self.length:
-            char = self.input[i]
-            
-            match char:
-                case TokenType.JSON_SPACE.value:
-                    self.tokens.append(Token(TokenType.JSON_SPACE))
-                case TokenType.JSON_CARRIAGE_RETURN.value:
-                    self.tokens.append(Token(TokenType.JSON_CARRIAGE_RETURN))
-                case TokenType.JSON_LINEFEED.value:
-                    self.tokens.append(Token(TokenType.JSON_LINEFEED))
-                case TokenType.JSON_TAB.value:
-                    self.tokens.append(Token(TokenType.JSON_TAB)) 
-                case TokenType.JSON_OPEN_BRACE.value:
-                    self.tokens.append(Token(TokenType.JSON_OPEN_BRACE))
-                case TokenType.JSON_CLOSE_BRACE.value:
-                    self.tokens.append(Token(TokenType.JSON_CLOSE_BRACE))
-                case TokenType.JSON_OPEN_BRACKET.value:
-                    self.tokens.append(Token(TokenType.JSON_OPEN_BRACKET))
-                case TokenType.JSON_CLOSE_BRACKET.value:
-                    self.tokens.append(Token(TokenType.JSON_CLOSE_BRACKET))
-                case TokenType.JSON_COLON.value:
-                    self.tokens.append(Token(TokenType.JSON_COLON))
-                case TokenType.JSON_COMMA.value:
-                    self.tokens.append(Token(TokenType.JSON_COMMA))
-                case TokenType.JSON_QUOTE.value:
-                    self.tokens.append(Token(TokenType.JSON_QUOTE))
-                    str_token, index = self.get_string(i)
-                    self.tokens.append(Token(TokenType.JSON_STRING, str_token))
-                    i = index
-                    self.tokens.append(Token(TokenType.JSON_QUOTE))
-                    continue
-                case char if char in '-0123456789':
-                    num_token, index = self.get_number(i)
-                    self.tokens.append(Token(TokenType.JSON_NUMBER, num_token))
-                    i = index
-                    continue
-                case char if char == 'n' and i + 4 < self.length and self.input[i: i + 4] == 'null':
-                    self.tokens.append(Token(TokenType.JSON_NULL))
-                    i += 4
-                    continue
-                case char if char == 't' and i + 4 < self.length and self.input[i: i + 4] == 'true':
-                    self.tokens.append(Token(TokenType.JSON_BOOL_TRUE))
-                    i += 4
-                    continue
-                case char if char == 'f' and i + 5 < self.length and self.input[i: i + 5] == 'false':
-                    self.tokens.append(Token(TokenType.JSON_BOOL_FALSE))
-                    i += 5
-                    continue
-                case ' ':
-                    pass
-                case _:
-                    raise Exception('Unexpected character \'{}\' at index {}'.format(char, i))
+        # Fills `self.tokens`, whitespace included, without creating a Token
+        # for any of them.
+        input = self.input
+        length = self.length
+        final = self.final
+        append = self.tokens.append
+        escaped = self.tokens.escaped
+        backslash = self.backslash
+        found = None
 
-            i += 1
+        for found in iter(self.pattern.scanner(input).match, None):
+            i = found.start()
+            for char in found.group(1):
+                append(WHITESPACE_CODES[char], i, i + 1)
+                i += 1
 
-    def get_string(self, i) -> tuple[str, int]:
-        str_tokens = deque()
+            kind = found.lastindex
+            start, end = found.span(kind)
+            code = GROUP_CODES[kind]
 
-        # Starting character is opening quote. Move forward.
-        i += 1
+            if code is not None:
+                append(code, start, end)
+            elif kind == STRING and input.find(backslash, start, end) < 0:
+                append(QUOTE_CODE, start - 1, start)
+                append(STRING_CODE, start, end)
+                append(QUOTE_CODE, end, end + 1)
+            elif kind == STRING or kind == ESCAPED_STRING:
+                # Decoded here only to reject invalid escapes; the store keeps
+                # the offsets and decodes again when the token is looked at.
+                unescape(input[start:end], start, self.line_index)
+                append(QUOTE_CODE, start - 1, start)
+                escaped.add(len(self.tokens))
+                append(STRING_CODE, start, end)
+                append(QUOTE_CODE, end, end + 1)
+            elif not final and end == length:
+                self.index = start
+                return
+            elif kind == NUMBER:
+                append(NUMBER_CODE, start, end)
+            else:
+                check_number(self.chars(start, end), start, self.line_index)
 
-        while i < self.length and self.input[i] != '"':
-            str_tokens.append(self.input[i])
+        i = found.end() if found is not None else 0
+        end = self.check_end(i)
+        for char in input[i:end]:
+            append(WHITESPACE_CODES[char], i, i + 1)
             i += 1
 
-        if i == self.length or self.input[i] != '"':
-            raise Exception('Missing end quote.')
-        
-        # End character is closing quote. Move forward.
-        i += 1
+    def iter_tokens(self, skip_whitespace: bool = True) -> Iterator[Token]:
+        # Tokens are produced on demand so the parser never needs the whole
+        # token list in memory. Whitespace carries no meaning for the parser,
+        # so by default it is skipped without allocating a token for it.
+        input = self.input
+        length = self.length
+        final = self.final
+        backslash = self.backslash
+        number_arrays = self.number_arrays
+        found = None
+        position = self.start
 
-        return ''.join(str_tokens), i
+        # Each scanner match starts exactly where the previous one ended, so
+        # the loop stops at the first character that does not start a token,
+        # or at the end of input. Either is handled after the loop. Taking a
+        # whole array of numbers at once starts a new scanner after it.
+        while True:
+            for found in iter(self.pattern.scanner(input, position).match, None):
+                self.found = found
+                if not skip_whitespace:
+                    yield from map(WHITESPACE_TOKENS.__getitem__, found.group(1))
 
-    def get_number(self, i) -> tuple[str, int]:
-        int_tokens = deque()
-        
-        while i < self.length and self.input[i] in '-+0123456789.eE':
-            int_tokens.append(self.input[i])
-            i += 1
-        
-        return ''.join(int_tokens), i
\ No newline at end of file
+                kind = found.lastindex
+                token = GROUP_TOKENS[kind]
+
+                if token is not None:
+                    if kind == OPEN_BRACKET and number_arrays is not None:
+                        close = self.match_number_array(found.end())
+                        if close is not None:
+                            values = self.number_array(found.end(), close.end() - 1)
+                            if values is not None:
+                                self.found = close
+                                self.array_start = found.start(kind)
+                                yield Token(TokenType.JSON_NUMBER_ARRAY, (values, 2 * len(values) + 1))
+                                found = close
+                                position = close.end()
+                                break
+                    yield token
+                elif kind == STRING:
+                    value = found.group(STRING)
+                    if backslash in value:
+                        value = unescape(value, found.start(STRING), self.line_index)
+                    yield QUOTE_TOKEN
+                    yield Token(TokenType.JSON_STRING, value)
+                    yield QUOTE_TOKEN
+                elif kind == ESCAPED_STRING:
+                    value = unescape(found.group(ESCAPED_STRING), found.start(ESCAPED_STRING), self.line_index)
+                    yield QUOTE_TOKEN
+                    yield Token(TokenType.JSON_STRING, value)
+                    yield QUOTE_TOKEN
+                elif not final and found.end() == length:
+                    # A number running into the end of a partial input may go on.
+                    self.index = found.start(kind)
+                    return
+                elif kind == NUMBER:
+                    yield Token(TokenType.JSON_NUMBER, found.group(NUMBER))
+                else:
+                    check_number(self.chars(*found.span(INVALID_NUMBER)), found.start(INVALID_NUMBER), self.line_index)
+            else:
+                break
+
+        i = found.end() if found is not None else self.start
+        end = self.check_end(i)
+        if not skip_whitespace:
+            for char in input[i:end]:
+                yield WHITESPACE_TOKENS[char]
+
+    def span(self) -> tuple[int, int]:
+        # Start and end offsets of the token `iter_tokens` handed out last,
+        # counting the quotes of a string and both brackets of an array of
+        # numbers.
+        found = self.found
+        kind = found.lastindex
+        if kind is None:
+            # An array of numbers, of which `found` matched the closing bracket.
+            return self.array_start, found.end()
+        start, end = found.span(kind)
+        if kind == STRING or kind == ESCAPED_STRING:
+            return start - 1, end + 1
+        return start, end
+
+    def match_number_array(self, position: int) -> re.Match | None:
+        # The match of the closing bracket if only numbers follow `position`
+        # up to one, None otherwise.
+        first, run, close = self.number_arrays
+        input = self.input
+        found = first.match(input, position)
+        if found is None:
+            return None
+        position = found.end()
+        while True:
+            end = run.match(input, position).end()
+            if end == position:
+                break
+            position = end
+        return close.match(input, position)
+
+    def number_array(self, start: int, end: int) -> array | None:
+        # The comma separated numbers between two offsets, which have already
+        # been matched as valid. None if an int does not fit array('q'); the
+        # array is then taken token by token instead.
+        body = self.input[start:end]
+        comma, dot, e, E = (b',', b'.', b'e', b'E') if self.is_buffer else (',', '.', 'e', 'E')
+        items = body.split(comma)
+        if dot in body or e in body or E in body:
+            return array('d', map(float, items))
+        try:
+            return array('q', map(int, items))
+        except OverflowError:
+            return None
+
+    def check_end(self, i: int) -> int:
+        # Called where scanning stopped. Past any whitespace this must be the
+        # end of input, or in a partial input the start of an incomplete
+        # token. Returns, and records in `index`, where the next token starts.
+        start = self.whitespace.match(self.input, i).end()
+        self.index = start
+        if start == self.length:
+            return start
+
+        char = self.chars(start, start + 1)
+        if not self.final and (char == '"' or self.length - start < 5 and any(literal.startswith(self.chars(start, self.length)) for literal in JSON_LITERALS)):
+            return start
+        if char == '"':
+            raise located('Missing end quote.', start, self.line_index)
+        raise located('Unexpected character \'{}\' at index {}'.format(char, start), start, self.line_index)
+
+    def chars(self, start: int, end: int) -> str:
+        # Source text between two offsets, for error messages and look-ahead
+        # checks; bytes that are not valid UTF-8 show up as latin-1.
+        chars = self.input[start:end]
+        if self.is_buffer:
+            return bytes(chars).decode('latin-1')
+        return chars
+
+class IncrementalLexer:
+    def __init__(self):
+        # Unscanned tail of the input, in the pieces it arrived in: at most
+        # one incomplete token plus whatever arrived after it.
+        self.pending: list[str] = []
+        # Whether that token is a string or a number. Only then can it grow
+        # long, so each new chunk is checked on its own for where the token
+        # ends, and the tail is joined and lexed again only once it does.
+        # `escaped` is set when the string so far ends in the middle of an
+        # escape.
+        self.in_string = False
+        self.in_number = False
+        self.escaped = False
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def feed(self, chunk: str | bytes) -> list[Token]:
+        if not isinstance(chunk, str):
+            chunk = self.decoder.decode(chunk)
+        if self.continues(chunk):
+            self.pending.append(chunk)
+            return []
+        return self.scan(chunk, final=False)
+
+    def close(self) -> list[Token]:
+        return self.scan(self.decoder.decode(b'', final=True), final=True)
+
+    def continues(self, chunk: str) -> bool:
+        # Whether the incomplete token runs on past the end of `chunk`.
+        if self.in_number:
+            return NUMBER_CHARS.fullmatch(chunk) is not None
+        if not self.in_string:
+            return False
+
+        start = 0
+        if self.escaped:
+            if not chunk:
+                return True
+            start = 1
+        end = STRING_BODY.match(chunk, start).end()
+        if end < len(chunk) and chunk[end] == '"':
+            return False
+        # Stopped short of the end only at a backslash with nothing after it.
+        self.escaped = end < len(chunk)
+        return True
+
+    def scan(self, chunk: str, final: bool) -> list[Token]:
+        self.pending.append(chunk)
+        input = ''.join(self.pending)
+        lexer = Lexer(input, final=final)
+        # Offsets here are within the unscanned tail, not the whole stream, so
+        # errors go without a line and column.
+        lexer.line_index = None
+        tokens = list(lexer.iter_tokens())
+
+        rest = input[lexer.index:]
+        self.pending = [rest] if rest else []
+        self.in_string = rest.startswith('"')
+        self.in_number = rest[:1] in NUMBER_START
+        self.escaped = False
+        if self.in_string:
+            self.continues(rest[1:])
+        return tokens
@@ -0,0 +1,107 @@
+import hashlib
+import marshal
+import sys
+from types import MappingProxyType
+from cache import LRUCache
+from parser import Parser
+
+DONE = object()
+
+def rebuild(value, frozen: bool) -> tuple[object, int]:
+    # Copies a parsed value, building containers bottom-up on an explicit
+    # stack like the parser does, so any depth the parser accepts works
+    # here too. Frozen copies turn objects into read-only mappings and
+    # arrays into tuples. Also returns the size of the copy in bytes, as
+    # sys.getsizeof summed over every value and key in it.
+    size = 0
+    # One (keys, values left to copy, values copied) frame per open
+    # container; keys is None for arrays.
+    stack = []
+
+    while True:
+        size += sys.getsizeof(value)
+        if type(value) is dict or type(value) is MappingProxyType:
+            keys = list(value)
+            size += sum(map(sys.getsizeof, keys))
+            stack.append((keys, iter(value.values()), []))
+        elif type(value) is list or type(value) is tuple:
+            stack.append((None, iter(value), []))
+        elif not stack:
+            return value, size
+        else:
+            stack[-1][2].append(value)
+
+        # Move on to the next value, closing every container that has none left.
+        while True:
+            keys, values, copied = stack[-1]
+            value = next(values, DONE)
+            if value is not DONE:
+                break
+
+            stack.pop()
+            if keys is None:
+                value = tuple(copied) if frozen else copied
+            else:
+                value = dict(zip(keys, copied))
+                if frozen:
+                    value = MappingProxyType(value)
+
+            if not stack:
+                return value, size
+            stack[-1][2].append(value)
+
+class ParseCache:
+    # Memoizing front-end to `Parser` for inputs that come back again and
+    # again. Results are kept per content hash in an LRU bounded both in
+    # entries and in bytes (the estimated size of the kept results).
+    #
+    # Callers must not be able to change a cached result, so by default it
+    # is returned frozen: objects as read-only mappings and arrays as
+    # tuples, shared by every caller. With `copy=True` each call returns a
+    # fresh mutable copy instead: the cache then keeps a marshal snapshot of
+    # the result, which loads much faster than a deep copy and whose length
+    # is its size.
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 << 20, copy: bool = False, max_depth: int | None = None):
+        self.results = LRUCache(max_entries, max_bytes)
+        self.copy = copy
+        self.max_depth = max_depth
+
+    def key(self, input: str | bytes) -> bytes:
+        if isinstance(input, str):
+            input = input.encode('utf-8', 'surrogatepass')
+        return hashlib.blake2b(input, digest_size=16).digest()
+
+    def parse(self, input: str | bytes):
+        key = self.key(input)
+        # Parsed documents are always an object or array, never None.
+        result = self.results.get(key)
+
+        if result is None:
+            result = Parser(input, max_depth=self.max_depth).json
+            if not self.copy:
+                result, size = rebuild(result, True)
+                self.results.put(key, result, size)
+                return result
+
+            try:
+                snapshot = marshal.dumps(result)
+                size = len(snapshot)
+            except ValueError:
+                # Too deeply nested to marshal: keep the result itself and
+                # copy it on every access.
+                snapshot, size = rebuild(result, False)
+            self.results.put(key, snapshot, size)
+            return result
+
+        if type(result) is bytes:
+            return marshal.loads(result)
+        if self.copy:
+            return rebuild(result, False)[0]
+        return result
+
+    def as_dict(self) -> dict:
+        # Entries, bytes, hits, misses and evictions, for monitoring.
+        return self.results.as_dict()
+
+    def clear(self) -> None:
+        self.results.clear()
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator
+from batch import bounded_results
+from cache import LRUCache
+from parser import Parser, KEY_CACHE_SIZE
+
+def parse_lines(data: bytes) -> list:
+    # Lines of one file mostly share their keys, so they share a key cache.
+    key_cache = LRUCache(KEY_CACHE_SIZE)
+    return [Parser(line.decode('utf-8'), key_cache=key_cache).json for line in data.splitlines() if line.strip()]
+
+def parse_range(path: str, start: int, end: int) -> list:
+    # Runs in a worker process, which reads its own byte range so the input
+    # never has to be pickled across.
+    with open(path, 'rb') as file:
+        file.seek(start)
+        return parse_lines(file.read(end - start))
+
+def line_ranges(path: str, chunk_size: int) -> Iterator[tuple[int, int]]:
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                # Extend the range to the end of the line it stops in.
+                file.seek(end - 1)
+                file.readline()
+                end = file.tell()
+            yield start, end
+            start = end
+
+def line_batches(stream: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            return
+        yield data + stream.readline()
+
+def read_ndjson(source: str | os.PathLike | BinaryIO, workers: int = 1, ordered: bool = True, chunk_size: int = 1 << 20) -> Iterator:
+    # Yields one parsed value per non-blank line of a newline-delimited JSON
+    # file path or binary stream. With workers > 1 the input is split into
+    # line-aligned batches of about `chunk_size` bytes that are parsed in a
+    # process pool. Values come out in input order unless `ordered` is False,
+    # in which case each batch is yielded as soon as it is done.
+    is_path = isinstance(source, (str, os.PathLike))
+
+    if workers <= 1:
+        stream = open(source, 'rb') if is_path else source
+        key_cache = LRUCache(KEY_CACHE_SIZE)
+        try:
+            for line in stream:
+                if line.strip():
+                    yield Parser(line.decode('utf-8'), key_cache=key_cache).json
+        finally:
+            if is_path:
+                stream.close()
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        if is_path:
+            path = os.fspath(source)
+            tasks = (executor.submit(parse_range, path, start, end) for start, end in line_ranges(path, chunk_size))
+        else:
+            tasks = (executor.submit(parse_lines, data) for data in line_batches(source, chunk_size))
+
+        yield from bounded_results(tasks, workers * 2, ordered)
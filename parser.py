@@ -1,269 +1,366 @@
-from collections import deque
-from math import inf
-from lexer import Lexer
+import mmap
+import os
+from array import array
+from collections import namedtuple
+from cache import LRUCache
+from lexer import Lexer, IncrementalLexer
 from lexer import TokenType, Token
+from sourcemap import LineIndex, escape_key
+from stats import ParseStats
 
-JSON_WHITESPACE = [TokenType.JSON_SPACE, TokenType.JSON_CARRIAGE_RETURN, TokenType.JSON_LINEFEED, TokenType.JSON_TAB]
+def to_number(token_value: str | bytes) -> int | float:
+    # The lexer only hands out numbers that match the JSON grammar, so a
+    # fraction or exponent is all that tells a float from an int.
+    if not isinstance(token_value, str):
+        token_value = token_value.decode('ascii')
+    if '.' in token_value or 'e' in token_value or 'E' in token_value:
+        return float(token_value)
+    return int(token_value)
+
+# Transitions of the object and array DFAs. State 1 follows the opening
+# brace or bracket and state 2 is the end state. Strings count as a single
+# token here: drivers step over the quote tokens around them.
+OBJECT_STATES = [
+    {},
+    {'close_brace': 2, 'key': 3},
+    {},
+    {'colon': 4},
+    {'value': 5},
+    {'close_brace': 2, 'comma': 6},
+    {'key': 3}
+]
+ARRAY_STATES = [
+    {},
+    {'close_bracket': 2, 'value': 3},
+    {},
+    {'comma': 4, 'close_bracket': 2},
+    {'value': 3}
+]
+
+GROUP_TOKEN_TYPES = {
+    'close_brace': (TokenType.JSON_CLOSE_BRACE,),
+    'close_bracket': (TokenType.JSON_CLOSE_BRACKET,),
+    'comma': (TokenType.JSON_COMMA,),
+    'colon': (TokenType.JSON_COLON,),
+    'key': (TokenType.JSON_STRING,),
+    'value': (
+        TokenType.JSON_STRING,
+        TokenType.JSON_NUMBER,
+        TokenType.JSON_BOOL_TRUE,
+        TokenType.JSON_BOOL_FALSE,
+        TokenType.JSON_NULL,
+        TokenType.JSON_OPEN_BRACE,
+        TokenType.JSON_OPEN_BRACKET,
+        TokenType.JSON_NUMBER_ARRAY,
+    ),
+}
+
+# The same DFAs keyed directly by token type, built once at import.
+OBJECT_TRANSITIONS = [
+    {token_type: next_state for group, next_state in state.items() for token_type in GROUP_TOKEN_TYPES[group]}
+    for state in OBJECT_STATES
+]
+ARRAY_TRANSITIONS = [
+    {token_type: next_state for group, next_state in state.items() for token_type in GROUP_TOKEN_TYPES[group]}
+    for state in ARRAY_STATES
+]
+
+# Distinct object keys, and with `records='namedtuple'` distinct key
+# sequences, remembered per parser by default.
+KEY_CACHE_SIZE = 1024
+SHAPE_CACHE_SIZE = 256
+
+def token_group(token: Token, is_object: bool, current_state: int) -> str:
+    if token.type == TokenType.JSON_CLOSE_BRACE:
+        return 'close_brace'
+    elif token.type == TokenType.JSON_CLOSE_BRACKET:
+        return 'close_bracket'
+    elif token.type == TokenType.JSON_COMMA:
+        return 'comma'
+    elif token.type == TokenType.JSON_COLON:
+        return 'colon'
+    elif is_object and token.type == TokenType.JSON_STRING and current_state in (1, 6):
+        return 'key'
+    return 'value'
 
 class Parser:
-    def __init__(self, str: str):
+    def __init__(
+        self,
+        str: str | bytes,
+        stats: ParseStats | None = None,
+        max_depth: int | None = None,
+        key_cache_size: int = KEY_CACHE_SIZE,
+        key_cache: LRUCache | None = None,
+        records: str | None = None,
+        typed_arrays: str | None = None,
+        source_map: bool = False,
+        start: int = 0,
+        line_index: LineIndex | None = None,
+        check_end: bool = True,
+    ):
         self.str = str
-        self.lexer = Lexer(str)
-        self.lexer.tokenize()
-        
-        self.pointer = 0
+
+        # Typed arrays: every array of only numbers is matched and converted
+        # in one go, and comes back as array('q') if all of them are ints or
+        # as array('d') otherwise (so ints in it become floats), or as the
+        # matching NumPy array with 'numpy'. Empty arrays stay lists.
+        if typed_arrays not in (None, 'array', 'numpy'):
+            raise Exception(f"Unknown typed arrays mode '{typed_arrays}', expected 'array' or 'numpy'")
+        self.numpy = None
+        if typed_arrays == 'numpy':
+            import numpy
+            self.numpy = numpy
+        # Parsing starts at offset `start`. Only the first value is parsed, but
+        # what follows it must still lex unless `check_end` is False, in which
+        # case it is not read at all and `lexer.span()` ends where the value
+        # does.
+        self.lexer = Lexer(str, number_arrays=typed_arrays is not None, start=start, line_index=line_index)
+        self.tokens = self.lexer.iter_tokens()
+        self.token: Token | None = None
+
+        # Deepest nesting of objects and arrays accepted, or None for no limit.
+        self.max_depth = max_depth
+
+        # Object keys are interned: a key seen before is looked up in the
+        # cache by its raw source text, so documents with many objects of the
+        # same schema share one str per key (with its hash already computed)
+        # instead of holding a fresh copy per object. Pass a `key_cache` to
+        # share it between parsers, or key_cache_size=0 to turn it off.
+        if key_cache is None and key_cache_size > 0:
+            key_cache = LRUCache(key_cache_size)
+        self.key_cache = key_cache
+
+        # Compact records: with 'tuple' every object becomes a tuple of its
+        # values, with 'namedtuple' an instance of a namedtuple class shared
+        # by all objects with the same keys in the same order. Keys that are
+        # not valid field names are renamed to _0, _1, ...
+        if records not in (None, 'tuple', 'namedtuple'):
+            raise Exception(f"Unknown records mode '{records}', expected 'tuple' or 'namedtuple'")
+        self.records = records
+        self.shapes = LRUCache(SHAPE_CACHE_SIZE)
+
+        # With `source_map`, the JSON Pointer of every value is mapped to its
+        # (start, end) offsets in the input, found during the parse itself.
+        self.source_map: dict | None = {} if source_map else None
+
+        # Built on the first error only, and shared with the lexer; pass a
+        # `line_index` to share it between parsers of the same input.
+        self.line_index = self.lexer.line_index
+
+        # Instrumentation is opt-in: only then is the token stream wrapped, so
+        # an uninstrumented parse pays nothing.
+        self.stats = stats
+        if stats is not None:
+            self.tokens = stats.count_tokens(self.tokens)
+
+        # Index of the current (lookahead) token in the non-whitespace stream.
+        self.pointer = -1
+        self.advance()
         self.json = self.parse()
+        if check_end:
+            for _ in self.tokens:
+                pass
+
+    def advance(self) -> None:
+        self.token = next(self.tokens, None)
+        self.pointer += 1
 
     def parse(self):
-        current_state = 0
-        states = [
-            {'open_brace': 1, 'open_bracket': 2, 'whitespace': 3},
-            {},
-            {},
-            {'open_brace': 1, 'open_bracket': 2, 'whitespace': 3}
-        ]
-        
-        while self.pointer < len(self.lexer.tokens):
-            token: Token = self.lexer.tokens[self.pointer]
-            
-            if token.type in JSON_WHITESPACE:
-                group = 'whitespace'
-            elif token.type == TokenType.JSON_OPEN_BRACE:
-                return self.parse_object()
-            elif token.type == TokenType.JSON_OPEN_BRACKET:
-                return self.parse_array()
-            else:
-                raise Exception(f"Unexpected token '{token.value}' at index {self.pointer}")
-            
-            current_state = states[current_state][group]
-            self.pointer += 1
-        
-        raise Exception("Input should either have an object or an array.")
-            
+        token = self.token
+
+        if token is None:
+            raise Exception("Input should either have an object or an array.")
+        elif token.type is TokenType.JSON_OPEN_BRACE or token.type is TokenType.JSON_OPEN_BRACKET or token.type is TokenType.JSON_NUMBER_ARRAY:
+            return self.parse_value()
+        else:
+            raise self.error(f"Unexpected token '{token.value}' at index {self.pointer}")
+
+    def error(self, message: str, offset: int | None = None) -> Exception:
+        # Errors give the token index as well as the line and column of the
+        # token they are about, or of `offset`.
+        if offset is None:
+            offset = self.lexer.span()[0]
+        return Exception('{} {}'.format(message, self.line_index.describe(offset)))
+
     def parse_object(self):
-        obj = {}
-        states = [
-            {'open_brace': 1},
-            {'whitespace': 2, 'close_brace': 3, 'quote': 4},
-            {'whitespace': 2, 'close_brace': 3, 'quote': 4},
-            {},
-            {'whitespace': 5, 'colon': 6},
-            {'whitespace': 5, 'colon': 6},
-            {'value': 8, 'whitespace': 7},
-            {'value': 8, 'whitespace': 7},
-            {'whitespace': 9, 'close_brace': 3, 'comma': 10},
-            {'whitespace': 9, 'close_brace': 3, 'comma': 10},
-            {'whitespace': 11, 'quote': 4},
-            {'whitespace': 11, 'quote': 4}
-        ]
-        current_state = 0
+        return self.parse_value()
+
+    def parse_array(self):
+        return self.parse_value()
+
+    def parse_number(self):
+        return to_number(self.token.value)
+
+    def parse_value(self):
+        token = self.token
+        token_type = token.type
+
+        if token_type is TokenType.JSON_BOOL_TRUE or token_type is TokenType.JSON_BOOL_FALSE or token_type is TokenType.JSON_NULL:
+            return token.value
+        elif token_type is TokenType.JSON_NUMBER:
+            return self.parse_number()
+        elif token_type is TokenType.JSON_QUOTE:
+            return self.parse_string()
+        elif token_type is TokenType.JSON_NUMBER_ARRAY:
+            if self.max_depth is not None and self.max_depth < 1:
+                raise self.error('Maximum nesting depth of {} exceeded at index {}'.format(self.max_depth, self.pointer))
+            if self.source_map is not None:
+                self.source_map[''] = self.lexer.span()
+            return self.number_array(token.value[0])
+        elif token_type is not TokenType.JSON_OPEN_BRACE and token_type is not TokenType.JSON_OPEN_BRACKET:
+            raise self.error('Unexpected character \'{}\' at index {}'.format(token.value, self.pointer))
+
+        # Objects and arrays are built in a single loop. The containers that
+        # are still open wait on an explicit stack instead of the call stack,
+        # so nesting depth is limited only by `max_depth`.
+        tokens = self.tokens
+        pointer = self.pointer
+        max_depth = self.max_depth
+        decode = self.lexer.is_buffer
+        key_cache = self.key_cache
+        records = self.records
+        # One (container, state to resume in, key) frame per enclosing container.
+        stack = []
+
+        # The JSON Pointer and start offset of the open container, and of
+        # every enclosing one, when building a source map.
+        source_map = self.source_map
+        if source_map is not None:
+            lexer = self.lexer
+            path = ''
+            path_start = lexer.span()[0]
+            paths = []
+
+        is_object = token_type is TokenType.JSON_OPEN_BRACE
+        container = {} if is_object else []
+        transitions = OBJECT_TRANSITIONS if is_object else ARRAY_TRANSITIONS
+        current_state = 1
         key = None
-        value = inf
-        
-        while self.pointer < len(self.lexer.tokens):
-            token: Token = self.lexer.tokens[self.pointer]
-            
-            if current_state == 0 and token.type == TokenType.JSON_OPEN_BRACE:
-                group = 'open_brace'
-            elif token.type == TokenType.JSON_CLOSE_BRACE:
-                group = 'close_brace'
-            elif token.type == TokenType.JSON_COMMA:
-                group = 'comma'
-            elif token.type == TokenType.JSON_COLON:
-                group = 'colon'
-            elif token.type in JSON_WHITESPACE:
-                group = 'whitespace'
-            elif token.type == TokenType.JSON_QUOTE and not key:
-                group = 'quote'
-                key = self.parse_string()
-            else:
-                group = 'value'
-                value = self.parse_value()
-            
-            if group not in states[current_state]:
-                raise Exception(f"Unexpected token '{token.value}' at index {self.pointer}")
-            
-            current_state = states[current_state][group]
-            
-            # If we've reached the end state (state 2), stop processing
-            if current_state == 3:
-                break
-            
-            if key is not None and value != inf:
-                obj[key] = value
+
+        if max_depth is not None and max_depth < 1:
+            raise self.error('Maximum nesting depth of {} exceeded at index {}'.format(max_depth, pointer))
+
+        while True:
+            token = next(tokens, None)
+            pointer += 1
+
+            if token is None:
+                self.token = None
+                self.pointer = pointer
+                raise self.error('Unexpected end of input at index {}'.format(pointer), self.lexer.length)
+
+            token_type = token.type
+            if token_type is TokenType.JSON_QUOTE:
+                # The lexer always hands out a string as quote, string, quote.
+                token = next(tokens)
+                next(tokens)
+                pointer += 2
+                token_type = TokenType.JSON_STRING
+
+            next_state = transitions[current_state].get(token_type)
+
+            if next_state is None:
+                self.token = token
+                self.pointer = pointer
+                if is_object:
+                    raise self.error(f"Unexpected token '{token.value}' at index {pointer}")
+                raise self.error(f"Unexpected character '{token.value}' at index {pointer}")
+
+            if next_state == 2:
+                value = container
+                if is_object and records is not None:
+                    value = self.record(container)
+                if source_map is not None:
+                    source_map[path] = (path_start, lexer.span()[1])
+                if not stack:
+                    self.token = token
+                    self.pointer = pointer
+                    return value
+
+                container, current_state, key = stack.pop()
+                if source_map is not None:
+                    path, path_start = paths.pop()
+                is_object = type(container) is dict
+                transitions = OBJECT_TRANSITIONS if is_object else ARRAY_TRANSITIONS
+            elif token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+                stack.append((container, next_state, key))
+                if max_depth is not None and len(stack) >= max_depth:
+                    self.token = token
+                    self.pointer = pointer
+                    raise self.error('Maximum nesting depth of {} exceeded at index {}'.format(max_depth, pointer))
+
+                if source_map is not None:
+                    paths.append((path, path_start))
+                    path += '/' + (escape_key(key) if is_object else str(len(container)))
+                    path_start = lexer.span()[0]
+
+                is_object = token_type is TokenType.JSON_OPEN_BRACE
+                container = {} if is_object else []
+                transitions = OBJECT_TRANSITIONS if is_object else ARRAY_TRANSITIONS
+                current_state = 1
                 key = None
-                value = inf
-            self.pointer += 1
-        
-        if current_state != 3:
-            raise Exception('Unexpected character \'{}\' at index {}'.format(self.str[self.pointer], self.pointer))
-        
-        return obj
+                continue
+            elif token_type is TokenType.JSON_STRING:
+                value = token.value
+                current_state = next_state
+                if is_object and next_state == 3 and key_cache is not None:
+                    key = key_cache.get(value)
+                    if key is None:
+                        # Strings with escapes come out of the lexer already decoded.
+                        key = value.decode('utf-8') if type(value) is not str else value
+                        key_cache.put(value, key)
+                    continue
 
-    def parse_array(self):
-        array = deque()
-        states = [
-            {'open_bracket': 1},
-            {'close_bracket': 2, 'whitespace': 3, 'value': 4 },
-            {},
-            {'close_bracket': 2, 'whitespace': 3, 'value': 4},
-            {'comma': 6, 'close_bracket': 2, 'whitespace': 5},
-            {'comma': 6, 'close_bracket': 2, 'whitespace': 5},
-            {'value': 4, 'whitespace': 3}
-        ]
-        current_state = 0
-        
-        while self.pointer < len(self.lexer.tokens):
-            token: Token = self.lexer.tokens[self.pointer]
-            
-            if current_state == 0 and token.type == TokenType.JSON_OPEN_BRACKET:
-                group = 'open_bracket'
-            elif token.type == TokenType.JSON_CLOSE_BRACKET:
-                group = 'close_bracket'
-            elif token.type in JSON_WHITESPACE:
-                group = 'whitespace'
-            elif token.type == TokenType.JSON_COMMA:
-                group = 'comma'
+                if decode and type(value) is not str:
+                    value = value.decode('utf-8')
+                if is_object and next_state == 3:
+                    key = value
+                    continue
+            elif token_type is TokenType.JSON_NUMBER:
+                value = to_number(token.value)
+                current_state = next_state
+            elif token_type is TokenType.JSON_NUMBER_ARRAY:
+                # One token for the whole array, brackets and commas included.
+                value, count = token.value
+                if max_depth is not None and len(stack) + 1 >= max_depth:
+                    self.token = token
+                    self.pointer = pointer
+                    raise self.error('Maximum nesting depth of {} exceeded at index {}'.format(max_depth, pointer))
+                pointer += count - 1
+                value = self.number_array(value)
+                current_state = next_state
+            elif token_type is TokenType.JSON_COMMA or token_type is TokenType.JSON_COLON:
+                current_state = next_state
+                continue
             else:
-                group = 'value'
-                value = self.parse_value()
-                array.append(value)
-            
-            if group not in states[current_state]:
-                raise Exception(f"Unexpected character '{token.value}' at index {self.pointer}")
-            
-            current_state = states[current_state][group]
-            
-            # If we've reached the end state (state 2), stop processing
-            if current_state == 2:
-                break
-            
-            self.pointer += 1
-        
-        if current_state != 2:
-            raise Exception('Unexpected character \'{}\' at index {}'.format(self.lexer.tokens[self.pointer], self.pointer))
-        
-        return list(array)
-    
-    def parse_number(self):
-        token_value = self.lexer.tokens[self.pointer].value
-        int_tokens = ""
-        states = [
-            # State 0: Initial state
-            # If the character is a minus sign, transition to state 1
-            # If the character is '0', transition to state 2
-            # If the character is a digit between 1-9, transition to state 3
-            {'minus': 1, 'zero': 2, 'digits_1_to_9': 3},
-            
-            # State 1: After encountering a minus sign
-            # If the character is '0', transition to state 2
-            # If the character is a digit between 1-9, transition to state 3
-            {'zero': 2, 'digits_1_to_9': 3},
-            
-            # State 2: After encountering '0'
-            # If the character is a dot (.), transition to state 5 (start of a decimal part)
-            # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
-            {'dot': 5, 'exponent': 6},
-            
-            # State 3: After encountering a digit from 1-9
-            # If the character is a dot (.), transition to state 5 (start of a decimal part)
-            # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
-            # If the character is a digit (0-9), remain in state 4 (continue reading digits)
-            {'dot': 5, 'exponent': 6, 'digits_0_to_9': 4},
-            
-            # State 4: After encountering additional digits
-            # If the character is a digit (0-9), remain in state 4 (continue reading digits)
-            # If the character is a dot (.), transition to state 5 (start of decimal part)
-            # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
-            {'digits_0_to_9': 4, 'dot': 5, 'exponent': 6},
-        
-            # State 5: After encountering a dot (decimal point)
-            # If the character is a digit (0-9), transition to state 7 (start of the fractional part)
-            {'digits_0_to_9': 7},
-            
-            # State 6: After encountering an exponent ('e' or 'E')
-            # If the character is a sign ('+' or '-'), transition to state 8 (to handle the sign of the exponent)
-            # If the character is a digit (0-9), transition to state 9 (to start reading the exponent digits)
-            {'sign': 8, 'digits_0_to_9': 9},
-            
-            # State 7: After encountering digits in the fractional part
-            # If the character is a digit (0-9), remain in state 7 (continue reading the fractional part)
-            # If the character is an exponent ('e' or 'E'), transition to state 6 (start of exponent part)
-            {'digits_0_to_9': 7, 'exponent': 6},
-            
-            # State 8: After encountering a sign in the exponent part
-            # If the character is a digit (0-9), transition to state 9 (start reading the exponent digits)
-            {'digits_0_to_9': 9},
-            
-            # State 9: After encountering digits in the exponent part
-            # If the character is a digit (0-9), remain in state 9 (continue reading the exponent digits)
-            {'digits_0_to_9': 9}
-        ]
+                value = token.value
+                current_state = next_state
 
-        current_state = 0
-        i = 0
-        length = len(token_value)
-        exponent = False
-        fraction = False
-
-        while i < length:
-            char = token_value[i]
-
-            # Only in the initial two states, we need to check 'zero' and 'minus' states.
-            if current_state == 0 or current_state == 1:
-                if char == '0':
-                    group = 'zero'
-                elif char in '123456789':
-                    group = 'digits_1_to_9'
-                elif char == '-':
-                    group = 'minus'
-                else:
-                    raise Exception(f"Unexpected character '{char}' at index {i} for starting a number")
+            # A closed container was mapped when its closing token came.
+            if source_map is not None and next_state != 2:
+                source_map[path + '/' + (escape_key(key) if is_object else str(len(container)))] = lexer.span()
+
+            if is_object:
+                container[key] = value
             else:
-                if char in '0123456789':
-                    group = 'digits_0_to_9'
-                elif char in '+-':
-                    group = 'sign'
-                elif char in 'eE':
-                    group = 'exponent'
-                    exponent = True
-                elif char == '.':
-                    group = 'dot'
-                    fraction = True
-                else:
-                    break
-            
-            if group not in states[current_state]:
-                raise Exception(f"Unexpected character '{char}' at index {i}")
+                container.append(value)
 
-            current_state = states[current_state][group]
-            int_tokens += char
-            i += 1
-        
-        if current_state not in [3, 4, 7, 9]:
-            raise Exception('Unexpected character \'{}\' at index {}'.format(token_value[i - 1], i - 1))
+    def number_array(self, values: array):
+        if self.numpy is None:
+            return values
+        return self.numpy.frombuffer(values, dtype=values.typecode)
 
-        if exponent or fraction:
-            return float(int_tokens)
-        return int(int_tokens)
+    def record(self, container: dict) -> tuple:
+        if self.records == 'tuple':
+            return tuple(container.values())
+
+        keys = tuple(container)
+        shape = self.shapes.get(keys)
+        if shape is None:
+            shape = namedtuple('Record', keys, rename=True)
+            self.shapes.put(keys, shape)
+        return shape._make(container.values())
 
-    def parse_value(self):
-        token = self.lexer.tokens[self.pointer]
-        
-        match token.type:
-            case TokenType.JSON_BOOL_TRUE | TokenType.JSON_BOOL_FALSE | TokenType.JSON_NULL:
-                return token.value
-            case _ if token.type == TokenType.JSON_NUMBER:
-                return self.parse_number()
-            case _ if token.type == TokenType.JSON_QUOTE:
-                return self.parse_string()
-            case _ if token.type == TokenType.JSON_OPEN_BRACE:
-                return self.parse_object()
-            case _ if token.type == TokenType.JSON_OPEN_BRACKET:
-                return self.parse_array()
-            case _:
-                raise Exception('Unexpected character \'{}\' at index {}'.format(token.value, self.pointer))
-    
     def parse_string(self):
         states = [
             {'quote': 1},
@@ -274,8 +371,8 @@ class Parser:
         str_value = None
         
         current_state = 0
-        while self.pointer < len(self.lexer.tokens):
-            token: Token = self.lexer.tokens[self.pointer]
+        while self.token is not None:
+            token: Token = self.token
             
             if token.type == TokenType.JSON_QUOTE:
                 group = 'quote'
@@ -283,10 +380,10 @@ class Parser:
                 group = 'string'
                 str_value = token.value
             else:
-                raise Exception('Unexpected character \'{}\' at index {}'.format(self.lexer.tokens[self.pointer], self.pointer))
+                raise Exception('Unexpected character \'{}\' at index {}'.format(token, self.pointer))
 
             if group not in states[current_state]:
-                raise Exception('Unexpected character \'{}\' at index {}'.format(self.lexer.tokens[self.pointer], self.pointer))
+                raise Exception('Unexpected character \'{}\' at index {}'.format(token, self.pointer))
 
             current_state = states[current_state][group]
             
@@ -294,9 +391,114 @@ class Parser:
             if current_state == 2:
                 break
                 
-            self.pointer += 1
+            self.advance()
         
         if current_state != 2:
-            raise Exception('Unexpected character \'{}\' at index {}'.format(self.lexer.tokens[self.pointer], self.pointer))
+            raise Exception('Unexpected end of input at index {}'.format(self.pointer))
+
+        # Over bytes-like input the lexer hands out raw slices; this is the
+        # point where the value is materialized, so decode it here.
+        if not isinstance(str_value, str):
+            return str_value.decode('utf-8')
+        return str_value
+
+def parse_file(path: str):
+    # Maps the file into memory and lexes the mapped bytes directly, so the
+    # file is never read into, or decoded as, one big string.
+    with open(path, 'rb') as file:
+        # An empty file cannot be mapped.
+        if not os.fstat(file.fileno()).st_size:
+            raise Exception("Input should either have an object or an array.")
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return Parser(buffer).json
+
+class IncrementalParser:
+    def __init__(self):
+        self.lexer = IncrementalLexer()
+        # One [container, state, key] frame per open object or array.
+        self.stack: list[list] = []
+        self.pointer = -1
+        self.done = False
+        self.closed = False
+        self.json = None
+
+    def feed(self, chunk: str | bytes) -> None:
+        self.check_open()
+        for token in self.lexer.feed(chunk):
+            self.push(token)
+
+    def close(self):
+        self.check_open()
+        self.closed = True
+        for token in self.lexer.close():
+            self.push(token)
+
+        if not self.done:
+            if self.pointer < 0:
+                raise Exception("Input should either have an object or an array.")
+            raise Exception('Unexpected end of input at index {}'.format(self.pointer))
+
+        return self.json
+
+    def check_open(self) -> None:
+        # Input given after `close` would otherwise be dropped without a word.
+        if self.closed:
+            raise Exception('The parser was already closed.')
+
+    def push(self, token: Token) -> None:
+        self.pointer += 1
+
+        # Like `Parser.parse`, anything after the top-level value is ignored.
+        # The lexer always emits a string as quote/string/quote, so the quotes
+        # carry no information of their own.
+        if self.done or token.type == TokenType.JSON_QUOTE:
+            return
+
+        if not self.stack:
+            if token.type == TokenType.JSON_OPEN_BRACE:
+                self.stack.append([{}, 1, None])
+            elif token.type == TokenType.JSON_OPEN_BRACKET:
+                self.stack.append([[], 1, None])
+            else:
+                raise Exception(f"Unexpected token '{token.value}' at index {self.pointer}")
+            return
+
+        frame = self.stack[-1]
+        container, current_state, key = frame
+        is_object = isinstance(container, dict)
+        states = OBJECT_STATES if is_object else ARRAY_STATES
+        group = token_group(token, is_object, current_state)
+
+        if group not in states[current_state]:
+            raise Exception(f"Unexpected token '{token.value}' at index {self.pointer}")
+
+        frame[1] = states[current_state][group]
+
+        match group:
+            case 'key':
+                frame[2] = token.value
+            case 'close_brace' | 'close_bracket':
+                self.stack.pop()
+                self.add(container)
+            case 'value' if token.type == TokenType.JSON_OPEN_BRACE:
+                self.stack.append([{}, 1, None])
+            case 'value' if token.type == TokenType.JSON_OPEN_BRACKET:
+                self.stack.append([[], 1, None])
+            case 'value' if token.type == TokenType.JSON_NUMBER:
+                self.add(to_number(token.value))
+            case 'value':
+                self.add(token.value)
+
+    def add(self, value) -> None:
+        if not self.stack:
+            self.json = value
+            self.done = True
+            return
+
+        container, _, key = self.stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
 
-        return str_value
\ No newline at end of file
@@ -0,0 +1,308 @@
+import re
+from typing import Iterator
+from lexer import Lexer, TokenType
+from lexer import GROUP_TOKENS, GROUP_TYPES, STRING, ESCAPED_STRING, NUMBER, INVALID_NUMBER, check_number, unescape
+from parser import Parser, OBJECT_TRANSITIONS, ARRAY_TRANSITIONS, to_number
+from validate import ARRAY_VALUE_STATE, OBJECT_VALUE_STATE, CONTAINER_LEVELS, TEXT_RUNS, BUFFER_RUNS, check, check_rest, skip_runs
+
+# One step of a path, applied to the children of a value:
+# ('member', key, index) selects the child with that object key or array
+# index (either may be None), ('any', None, None) every child, and
+# ('filter', keys, (operator, operand)) every child for which the test holds.
+MEMBER = 'member'
+ANY = 'any'
+FILTER = 'filter'
+
+JSONPATH_STEP = re.compile(r"""
+    \.\*|\[\*\]
+    |\.([A-Za-z_][A-Za-z0-9_]*)
+    |\[([0-9]+)\]
+    |\['((?:[^'\\]|\\.)*)'\]
+    |\[\?\((.*?)\)\]
+""", re.VERBOSE)
+FILTER_EXPRESSION = re.compile(r'\s*@((?:\.[A-Za-z_][A-Za-z0-9_]*)*)\s*(?:(==|!=|<=|>=|<|>)\s*(.+?))?\s*')
+COMPARISONS = {
+    '==': lambda a, b: equal(a, b),
+    '!=': lambda a, b: not equal(a, b),
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+def parse_path(path: str) -> list[tuple]:
+    # A JSON Pointer (RFC 6901), where a `*` segment also matches every
+    # child, or a JSONPath made of `$`, `.key`, `['key']`, `[index]`, `.*`,
+    # `[*]` and filters like `[?(@.price < 10)]`.
+    if path == '' or path.startswith('/'):
+        steps = []
+        for segment in path.split('/')[1:]:
+            if segment == '*':
+                steps.append((ANY, None, None))
+                continue
+            key = segment.replace('~1', '/').replace('~0', '~')
+            index = int(key) if key.isdigit() and (key == '0' or key[0] != '0') else None
+            steps.append((MEMBER, key, index))
+        return steps
+
+    if not path.startswith('$'):
+        raise Exception("Invalid path '{}', expected a JSON Pointer or a JSONPath".format(path))
+
+    steps = []
+    position = 1
+    while position < len(path):
+        found = JSONPATH_STEP.match(path, position)
+        if found is None:
+            raise Exception("Invalid path '{}' at index {}".format(path, position))
+        name, index, quoted, expression = found.groups()
+        if name is not None:
+            steps.append((MEMBER, name, None))
+        elif index is not None:
+            steps.append((MEMBER, None, int(index)))
+        elif quoted is not None:
+            steps.append((MEMBER, re.sub(r'\\(.)', r'\1', quoted), None))
+        elif expression is not None:
+            steps.append((FILTER, *parse_filter(expression)))
+        else:
+            steps.append((ANY, None, None))
+        position = found.end()
+    return steps
+
+def parse_filter(expression: str) -> tuple[list, tuple | None]:
+    found = FILTER_EXPRESSION.fullmatch(expression)
+    if found is None:
+        raise Exception("Invalid filter '{}'".format(expression))
+    keys, operator, operand = found.groups()
+    keys = keys.split('.')[1:]
+    if operator is None:
+        return keys, None
+
+    if len(operand) >= 2 and operand[0] == operand[-1] == "'":
+        value = operand[1:-1]
+    else:
+        try:
+            value = Parser('[' + operand + ']').json
+        except Exception:
+            raise Exception("Invalid filter '{}'".format(expression))
+        if len(value) != 1:
+            raise Exception("Invalid filter '{}'".format(expression))
+        value = value[0]
+    return keys, (operator, value)
+
+def equal(a, b) -> bool:
+    # Equality of JSON values: unlike in Python, true is not 1 and false is
+    # not 0, while ints and floats still compare by value.
+    if (type(a) is bool) != (type(b) is bool):
+        return False
+    if type(a) is dict:
+        return type(b) is dict and a.keys() == b.keys() and all(equal(a[key], b[key]) for key in a)
+    if type(a) is list:
+        return type(b) is list and len(a) == len(b) and all(map(equal, a, b))
+    return a == b
+
+def test(value, keys: list, comparison: tuple | None) -> bool:
+    for key in keys:
+        if type(value) is not dict or key not in value:
+            return False
+        value = value[key]
+    if comparison is None:
+        return True
+
+    operator, operand = comparison
+    if operator not in ('==', '!='):
+        # Order only numbers with numbers and strings with strings.
+        is_number = type(value) in (int, float) and type(operand) in (int, float)
+        if not is_number and not (type(value) is str and type(operand) is str):
+            return False
+    return COMPARISONS[operator](value, operand)
+
+def holds(candidate: str | bytes, keys: list, comparison: tuple | None) -> bool:
+    # `test` for an object or array that has not been built.
+    if not keys:
+        return test(Parser(candidate).json, keys, comparison)
+    for value in scan(candidate, [(MEMBER, key, None) for key in keys]):
+        return test(value, [], comparison)
+    return False
+
+def matches(step: tuple, key: str | None, index: int | None) -> bool:
+    kind, step_key, step_index = step
+    if kind is MEMBER:
+        return key == step_key if key is not None else index == step_index
+    return True
+
+def iter_query(input: str | bytes, path: str) -> Iterator:
+    # Yields every value the path selects, in document order, reading the
+    # lexer's tokens straight off the input without building anything
+    # outside of them. Objects and arrays that cannot hold a match are
+    # stepped over, in runs of members where possible; a match that is an
+    # object or array is parsed on its own once its end is found.
+    # When the path can select one value only (no wildcards or filters), the
+    # scan stops as soon as that value has been read, so the rest of the
+    # input is never looked at, let alone validated. Errors in the part that
+    # is read are the ones `Parser` raises.
+    return scan(input, parse_path(path))
+
+def scan(input: str | bytes, steps: list) -> Iterator:
+    if not steps:
+        yield Parser(input).json
+        return
+    single = all(step[0] is MEMBER for step in steps)
+
+    lexer = Lexer(input)
+    backslash = lexer.backslash
+    # One [transitions, state, steps matched, key, next index, start, rest]
+    # frame per open container. Steps matched is None for containers that
+    # cannot hold a match, which includes everything inside a match. A
+    # container that is a match keeps its start offset until it closes; if
+    # a filter selected it, rest is where the steps left to apply begin.
+    stack = []
+    frame = None
+    match = lexer.pattern.match
+    runs = (BUFFER_RUNS if lexer.is_buffer else TEXT_RUNS)[CONTAINER_LEVELS]
+    position = 0
+    # Offset of the next backslash, kept between calls to `skip_runs`.
+    escape = -1
+
+    while True:
+        # Where nothing can match, whole runs of members are stepped over in
+        # one regex match, as `validate` does.
+        if frame is not None and frame[2] is None:
+            if frame[0] is ARRAY_TRANSITIONS and frame[1] == ARRAY_VALUE_STATE:
+                run = runs[0].match
+            elif frame[0] is OBJECT_TRANSITIONS and frame[1] == OBJECT_VALUE_STATE:
+                run = runs[1].match
+            else:
+                run = None
+            if run is not None:
+                position, escape = skip_runs(input, position, escape, run, backslash)
+
+        found = match(input, position)
+        if found is None:
+            break
+        position = found.end()
+        kind = found.lastindex
+        token_type = GROUP_TYPES[kind]
+
+        if kind == STRING or kind == ESCAPED_STRING:
+            start, end = found.span(kind)
+            if kind == ESCAPED_STRING or input.find(backslash, start, end) >= 0:
+                unescape(input[start:end], start, lexer.line_index)
+        elif kind == INVALID_NUMBER:
+            check_number(lexer.chars(*found.span(INVALID_NUMBER)), found.start(INVALID_NUMBER), lexer.line_index)
+
+        if frame is None:
+            if token_type is not TokenType.JSON_OPEN_BRACE and token_type is not TokenType.JSON_OPEN_BRACKET:
+                break
+            transitions = OBJECT_TRANSITIONS if token_type is TokenType.JSON_OPEN_BRACE else ARRAY_TRANSITIONS
+            frame = [transitions, 1, 0, None, 0, None, None]
+            continue
+
+        next_state = frame[0][frame[1]].get(token_type)
+        if next_state is None:
+            break
+        frame[1] = next_state
+
+        if next_state == 2:
+            start = frame[5]
+            done = frame
+            frame = stack.pop() if stack else None
+
+            if start is not None:
+                rest = done[6]
+                if rest is None:
+                    yield Parser(input[start:found.end()]).json
+                    if single:
+                        return
+                elif rest == len(steps):
+                    value = Parser(input[start:found.end()]).json
+                    if test(value, steps[rest - 1][1], steps[rest - 1][2]):
+                        yield value
+                else:
+                    # Only what the filter and the steps after it need is
+                    # read out of a filtered object or array.
+                    candidate = input[start:found.end()]
+                    if holds(candidate, steps[rest - 1][1], steps[rest - 1][2]):
+                        yield from scan(candidate, steps[rest:])
+            if frame is None:
+                # Read to the end of the document, so what follows it must
+                # lex, as in `Parser`.
+                check_rest(lexer, position)
+                return
+            continue
+
+        if token_type is TokenType.JSON_COMMA or token_type is TokenType.JSON_COLON:
+            continue
+
+        is_object = frame[0] is OBJECT_TRANSITIONS
+        if is_object and next_state == 3:
+            # A key, only decoded if it may be matched.
+            if frame[2] is not None:
+                frame[3] = string_value(lexer, found)
+            continue
+
+        # The start of a value: find out whether it is on the path.
+        depth = frame[2]
+        if depth is not None:
+            if is_object:
+                key, index = frame[3], None
+            else:
+                key, index = None, frame[4]
+                frame[4] += 1
+            step = steps[depth]
+            if not matches(step, key, index):
+                depth = None
+            else:
+                if step[0] is MEMBER:
+                    # No other child can match, so the rest of this container
+                    # is stepped over. With duplicate keys the first one
+                    # counts, unlike in `Parser`, where the last one does.
+                    frame[2] = None
+
+                if step[0] is FILTER or depth + 1 == len(steps):
+                    if token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+                        stack.append(frame)
+                        transitions = OBJECT_TRANSITIONS if token_type is TokenType.JSON_OPEN_BRACE else ARRAY_TRANSITIONS
+                        frame = [transitions, 1, None, None, 0, found.start(kind), depth + 1 if step[0] is FILTER else None]
+                        continue
+
+                    value = scalar_value(lexer, found)
+                    if step[0] is not FILTER:
+                        yield value
+                        if single:
+                            return
+                    elif depth + 1 == len(steps) and test(value, step[1], step[2]):
+                        # A string, number or literal has nothing further
+                        # steps could select.
+                        yield value
+                    continue
+                depth += 1
+
+        if token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+            stack.append(frame)
+            transitions = OBJECT_TRANSITIONS if token_type is TokenType.JSON_OPEN_BRACE else ARRAY_TRANSITIONS
+            frame = [transitions, 1, depth, None, 0, None, None]
+
+    # The input ended early or holds something `Parser` rejects; let the
+    # validator raise the same error.
+    check(input)
+    raise Exception("Input should either have an object or an array.")
+
+def query(input: str | bytes, path: str) -> list:
+    return list(iter_query(input, path))
+
+def string_value(lexer: Lexer, found: re.Match) -> str:
+    kind = found.lastindex
+    value = found.group(kind)
+    if kind == ESCAPED_STRING or lexer.backslash in value:
+        return unescape(value, found.start(kind))
+    if lexer.is_buffer:
+        return value.decode('utf-8')
+    return value
+
+def scalar_value(lexer: Lexer, found: re.Match):
+    kind = found.lastindex
+    if kind == STRING or kind == ESCAPED_STRING:
+        return string_value(lexer, found)
+    if kind == NUMBER:
+        return to_number(found.group(NUMBER))
+    return GROUP_TOKENS[kind].value
@@ -0,0 +1,34 @@
+import re
+from array import array
+from bisect import bisect_right
+
+TEXT_NEWLINE = re.compile('\n')
+BUFFER_NEWLINE = re.compile(b'\n')
+
+class LineIndex:
+    # Turns offsets into the input into (line, column) pairs, both counted
+    # from 1. The offsets at which lines start are only collected the first
+    # time they are needed, then each lookup is a binary search. Offsets and
+    # columns count bytes for bytes-like input and characters for str.
+    def __init__(self, input: str | bytes):
+        self.input = input
+        self.starts: array | None = None
+
+    def location(self, offset: int) -> tuple[int, int]:
+        if self.starts is None:
+            newline = TEXT_NEWLINE if isinstance(self.input, str) else BUFFER_NEWLINE
+            offset_code = 'I' if len(self.input) < 2 ** 32 else 'Q'
+            self.starts = array(offset_code, [0])
+            self.starts.extend(found.end() for found in newline.finditer(self.input))
+
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def describe(self, offset: int) -> str:
+        return '(line {}, column {})'.format(*self.location(offset))
+
+def escape_key(key: str) -> str:
+    # An object key as a JSON Pointer (RFC 6901) reference token.
+    if '~' in key or '/' in key:
+        return key.replace('~', '~0').replace('/', '~1')
+    return key
@@ -0,0 +1,103 @@
+from collections import Counter, defaultdict
+from time import perf_counter
+from typing import Iterator
+from lexer import Token, TokenType
+
+# Which parse phase a token belongs to. Punctuation belongs to the innermost
+# open container, and literals to 'parse_value'.
+TOKEN_PHASES = {
+    TokenType.JSON_OPEN_BRACE: 'parse_object',
+    TokenType.JSON_OPEN_BRACKET: 'parse_array',
+    TokenType.JSON_QUOTE: 'parse_string',
+    TokenType.JSON_STRING: 'parse_string',
+    TokenType.JSON_NUMBER: 'parse_number',
+    TokenType.JSON_BOOL_TRUE: 'parse_value',
+    TokenType.JSON_BOOL_FALSE: 'parse_value',
+    TokenType.JSON_NULL: 'parse_value',
+}
+
+class ParseStats:
+    # Opt-in instrumentation for one or more `Parser` runs. Pass an instance
+    # as `Parser(input, stats=...)`; without it the parser runs untouched.
+    # Everything is measured on the token stream between lexer and parser.
+    def __init__(self):
+        # Seconds per phase: 'tokenize' is the time spent pulling tokens from
+        # the lexer. The parser's time between two pulls goes to the phase of
+        # the token it was handling, so 'parse_object' covers the braces,
+        # colons and commas of objects, 'parse_string' covers strings, etc.
+        self.times: defaultdict[str, float] = defaultdict(float)
+        # Values of each kind parsed, by the parse phase that handles them.
+        self.calls: Counter[str] = Counter()
+        self.tokens: Counter[TokenType] = Counter()
+        self.max_depth = 0
+        self.string_bytes = 0
+        self.number_bytes = 0
+        # Objects created along the way: Python values per kind, and the
+        # lexer tokens that carry a value of their own.
+        self.allocations: Counter[str] = Counter()
+
+    def count_tokens(self, tokens: Iterator[Token]) -> Iterator[Token]:
+        # The phase of every open container, innermost last.
+        containers: list[str] = []
+        phase = None
+        pulled = perf_counter()
+
+        while True:
+            start = perf_counter()
+            if phase is not None:
+                self.times[phase] += start - pulled
+
+            token = next(tokens, None)
+            pulled = perf_counter()
+            self.times['tokenize'] += pulled - start
+
+            if token is None:
+                return
+
+            token_type = token.type
+            self.tokens[token_type] += 1
+            phase = TOKEN_PHASES.get(token_type)
+
+            if token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+                containers.append(phase)
+                self.calls[phase] += 1
+                self.allocations['object' if phase == 'parse_object' else 'array'] += 1
+                self.max_depth = max(self.max_depth, len(containers))
+            elif token_type is TokenType.JSON_CLOSE_BRACE or token_type is TokenType.JSON_CLOSE_BRACKET:
+                phase = containers.pop() if containers else 'parse_value'
+            elif token_type is TokenType.JSON_STRING:
+                self.calls[phase] += 1
+                self.string_bytes += len(token.value)
+                self.allocations['token'] += 1
+                self.allocations['string'] += 1
+            elif token_type is TokenType.JSON_NUMBER:
+                self.calls[phase] += 1
+                self.number_bytes += len(token.value)
+                self.allocations['token'] += 1
+                self.allocations['number'] += 1
+            elif phase is None:
+                phase = containers[-1] if containers else 'parse_value'
+            elif token_type is not TokenType.JSON_QUOTE:
+                self.calls[phase] += 1
+
+            yield token
+
+    def as_dict(self) -> dict:
+        return {
+            'times': dict(self.times),
+            'calls': dict(self.calls),
+            'tokens': {token_type.name: count for token_type, count in self.tokens.items()},
+            'max_depth': self.max_depth,
+            'string_bytes': self.string_bytes,
+            'number_bytes': self.number_bytes,
+            'allocations': dict(self.allocations),
+        }
+
+    def report(self) -> str:
+        lines = ['{:<14} {:>10} {:>10}'.format('phase', 'seconds', 'calls')]
+        for name, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            lines.append('{:<14} {:>10.4f} {:>10}'.format(name, seconds, self.calls[name] or ''))
+        lines.append('tokens: ' + ', '.join('{}={}'.format(token_type.name, count) for token_type, count in self.tokens.most_common()))
+        lines.append('max depth: {}, string bytes: {}, number bytes: {}'.format(self.max_depth, self.string_bytes, self.number_bytes))
+        lines.append('allocations: ' + ', '.join('{}={}'.format(kind, count) for kind, count in self.allocations.most_common()))
+        return '\n'.join(lines)
@@ -1,5 +1,54 @@
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import re
+import tempfile
 import unittest
-from parser import Parser
+import unittest.mock
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+import benchmark
+from aio import FEED_SIZE, StreamParser, iter_values
+from batch import bounded_results, parse_many
+from cache import LRUCache
+from documents import iter_documents, iter_file_documents
+from encoder import dump, dumps
+from events import iter_events, items
+from lazy import LazyDocument, StructuralIndex
+from lexer import IncrementalLexer, Lexer, TokenType
+from memo import ParseCache
+from ndjson import read_ndjson
+from parser import Parser, IncrementalParser, parse_file
+from query import query
+from sourcemap import LineIndex
+from stats import ParseStats
+from validate import validate, skip_runs
+
+def count_lexed(lexer: IncrementalLexer) -> list:
+    # Characters lexed by each scan of `lexer`, filled in as it is fed.
+    lexed = []
+    scan = lexer.scan
+    def counted(chunk, final):
+        lexed.append(sum(map(len, lexer.pending)) + len(chunk))
+        return scan(chunk, final)
+    lexer.scan = counted
+    return lexed
+
+@contextlib.contextmanager
+def run_lookahead(module: str):
+    # How far ahead of its start each run of members taken by `module` is
+    # allowed to match, one entry per run.
+    lookahead = []
+    def skip(input, position, escape, run, backslash):
+        def bounded(input, start, end):
+            lookahead.append(end - start)
+            return run(input, start, end)
+        return skip_runs(input, position, escape, bounded, backslash)
+    with unittest.mock.patch(module + '.skip_runs', skip):
+        yield lookahead
 
 class TestJsonParser(unittest.TestCase):
 
@@ -93,6 +142,13 @@ class TestJsonParser(unittest.TestCase):
         with self.assertRaises(Exception):
             Parser(string)
 
+    def test_trailing_garbage(self):
+        with self.assertRaisesRegex(Exception, "Unexpected character '@' at index 4"):
+            Parser('[1] @')
+        with self.assertRaisesRegex(Exception, "Unexpected character 'x' at index 8"):
+            Parser('{"a":1} x')
+        self.assertEqual(Parser('{"a":1} \n').json, {"a": 1})
+
     def test_extra_comma_in_object(self):
         string = '{"name": "John",}'
         with self.assertRaises(Exception):
@@ -148,5 +204,906 @@ class TestJsonParser(unittest.TestCase):
         parser = Parser(string)
         self.assertDictEqual(parser.json, {"flag": None})
 
+    def test_zero(self):
+        string = '[0, -0, 0.5]'
+        parser = Parser(string)
+        self.assertListEqual(parser.json, [0, 0, 0.5])
+
+    def test_empty_string_key(self):
+        string = '{"": "value"}'
+        parser = Parser(string)
+        self.assertDictEqual(parser.json, {"": "value"})
+
+    def test_deep_nesting(self):
+        string = '[{"a": ' * 10000 + '1' + '}]' * 10000
+        parser = Parser(string)
+        value = parser.json
+        for _ in range(10000):
+            value = value[0]["a"]
+        self.assertEqual(value, 1)
+
+    def test_max_depth(self):
+        self.assertListEqual(Parser('[[[1]]]', max_depth=3).json, [[[1]]])
+        with self.assertRaises(Exception) as context:
+            Parser('[{"a": [1]}]', max_depth=2)
+        self.assertEqual(str(context.exception), "Maximum nesting depth of 2 exceeded at index 6 (line 1, column 8)")
+
+    def test_unclosed_nesting(self):
+        with self.assertRaises(Exception) as context:
+            Parser('{"a": [1, {"b": 2}')
+        self.assertEqual(str(context.exception), "Unexpected end of input at index 15 (line 1, column 19)")
+
+    def test_string_escapes(self):
+        string = r'{"quote \"x\"": "a\\b\/c\b\f\n\r\t", "path": "C:\\"}'
+        parser = Parser(string)
+        self.assertDictEqual(parser.json, {'quote "x"': "a\\b/c\b\f\n\r\t", "path": "C:\\"})
+
+    def test_unicode_escapes(self):
+        string = r'["\u00e9\u4E2D", "\ud83d\ude00", "\ud800"]'
+        self.assertListEqual(Parser(string).json, ["\u00e9\u4e2d", "\U0001F600", "\ud800"])
+        self.assertListEqual(Parser(string.encode('utf-8')).json, ["\u00e9\u4e2d", "\U0001F600", "\ud800"])
+
+    def test_invalid_escape(self):
+        with self.assertRaises(Exception) as context:
+            Parser(r'["ab\x"]')
+        self.assertEqual(str(context.exception), "Invalid escape '\\x' at index 4 (line 1, column 5)")
+        with self.assertRaises(Exception) as context:
+            Parser(r'["é\u12"]'.encode('utf-8'))
+        self.assertEqual(str(context.exception), "Invalid escape '\\u' at index 4 (line 1, column 5)")
+
+    def test_invalid_escape_at_top_level(self):
+        # The escape is checked before the string's opening quote reaches the
+        # parser, as for strings the lexer takes on its fast path.
+        for check in (Parser, validate):
+            with self.assertRaises(Exception) as context:
+                check(r'"a\"\q"')
+            self.assertEqual(str(context.exception), "Invalid escape '\\q' at index 4 (line 1, column 5)")
+
+class TestLexer(unittest.TestCase):
+
+    def test_iter_tokens_is_lazy(self):
+        tokens = Lexer('[1, 2]').iter_tokens()
+        self.assertEqual(next(tokens).type, TokenType.JSON_OPEN_BRACKET)
+        self.assertEqual(next(tokens).value, '1')
+
+    def test_iter_tokens_skips_whitespace(self):
+        types = [token.type for token in Lexer(' [ 1 ,\n\t2 ]\r\n')]
+        self.assertListEqual(types, [
+            TokenType.JSON_OPEN_BRACKET,
+            TokenType.JSON_NUMBER,
+            TokenType.JSON_COMMA,
+            TokenType.JSON_NUMBER,
+            TokenType.JSON_CLOSE_BRACKET,
+        ])
+
+    def test_number_validated_while_scanning(self):
+        with self.assertRaisesRegex(Exception, "Unexpected character '1' at index 1"):
+            list(Lexer('[01]'))
+        with self.assertRaisesRegex(Exception, "Unexpected character '.' at index 1"):
+            list(Lexer('[1.]'))
+
+    def test_numbers(self):
+        values = [token.value for token in Lexer('[-0.5e+3, 0, 12E2]') if token.type == TokenType.JSON_NUMBER]
+        self.assertListEqual(values, ['-0.5e+3', '0', '12E2'])
+
+    def test_unterminated_string(self):
+        with self.assertRaisesRegex(Exception, 'Missing end quote.'):
+            list(Lexer('["abc]'))
+
+    def test_tokenize_keeps_whitespace(self):
+        lexer = Lexer('[ 1]')
+        lexer.tokenize()
+        self.assertEqual(len(lexer.tokens), 4)
+        self.assertEqual(lexer.tokens[1].type, TokenType.JSON_SPACE)
+
+    def test_tokenize_compact_store(self):
+        lexer = Lexer('{"name": [1.5, null]}')
+        lexer.tokenize()
+        self.assertEqual(lexer.tokens.types.itemsize, 1)
+        self.assertListEqual(list(lexer.tokens.starts), [0, 1, 2, 6, 7, 8, 9, 10, 13, 14, 15, 19, 20])
+        self.assertEqual(lexer.tokens[2].value, 'name')
+        self.assertEqual(lexer.tokens[10].type, TokenType.JSON_NULL)
+        self.assertListEqual(
+            [(token.type, token.value) for token in lexer.tokens],
+            [(token.type, token.value) for token in Lexer('{"name": [1.5, null]}').iter_tokens(skip_whitespace=False)]
+        )
+
+    def test_tokenize_escaped_string(self):
+        lexer = Lexer(r'["a\"b", "c"]')
+        lexer.tokenize()
+        self.assertEqual(lexer.tokens[2].value, 'a"b')
+        self.assertEqual(lexer.tokens[7].value, 'c')
+        self.assertSetEqual(lexer.tokens.escaped, {2})
+
+class TestIncrementalParser(unittest.TestCase):
+
+    def parse_in_chunks(self, data, size):
+        parser = IncrementalParser()
+        for i in range(0, len(data), size):
+            parser.feed(data[i:i + size])
+        return parser.close()
+
+    def test_single_chunk(self):
+        parser = IncrementalParser()
+        parser.feed('{"name": "John", "age": 30}')
+        self.assertDictEqual(parser.close(), {"name": "John", "age": 30})
+
+    def test_every_chunk_boundary(self):
+        string = '{"list": [10, -2.5e3, true, false, null], "name": "John Doe"}'
+        for size in range(1, 8):
+            self.assertDictEqual(self.parse_in_chunks(string, size), Parser(string).json)
+
+    def test_bytes_split_inside_utf8_character(self):
+        data = '["café", "über"]'.encode('utf-8')
+        self.assertListEqual(self.parse_in_chunks(data, 1), ["café", "über"])
+
+    def test_chunk_split_inside_escape(self):
+        string = r'{"a\"b": ["\ud83d\ude00", "x\\"]}'
+        for size in range(1, 8):
+            self.assertDictEqual(self.parse_in_chunks(string, size), {'a"b': ["\U0001F600", "x\\"]})
+
+    def test_long_string_in_many_chunks(self):
+        # Only each new chunk is searched for the end of an open string, so
+        # the tail is lexed once when it ends instead of on every feed.
+        blob = 'A' * (1 << 20)
+        data = ('{"blob": "' + blob + '\\\\", "n": ' + '0.' + '5' * 200000 + '}').encode('utf-8')
+        parser = IncrementalParser()
+        lexed = count_lexed(parser.lexer)
+        for start in range(0, len(data), 1 << 12):
+            parser.feed(data[start:start + (1 << 12)])
+        value = parser.close()
+        self.assertLess(sum(lexed), 2 * len(data))
+        self.assertEqual(value["blob"], blob + '\\')
+        self.assertEqual(value["n"], float('0.' + '5' * 200000))
+
+    def test_incomplete_input(self):
+        parser = IncrementalParser()
+        parser.feed('{"name": "Jo')
+        with self.assertRaises(Exception):
+            parser.close()
+
+    def test_invalid_token(self):
+        parser = IncrementalParser()
+        with self.assertRaises(Exception):
+            parser.feed('[1, 2,]')
+
+    def test_empty_input(self):
+        for chunks in ([], [''], [' \n']):
+            parser = IncrementalParser()
+            for chunk in chunks:
+                parser.feed(chunk)
+            with self.assertRaisesRegex(Exception, 'Input should either have an object or an array.'):
+                parser.close()
+
+    def test_use_after_close(self):
+        parser = IncrementalParser()
+        parser.feed('[1]')
+        self.assertListEqual(parser.close(), [1])
+        with self.assertRaisesRegex(Exception, 'The parser was already closed.'):
+            parser.feed('[2]')
+        with self.assertRaisesRegex(Exception, 'The parser was already closed.'):
+            parser.close()
+
+class TestEvents(unittest.TestCase):
+
+    def test_event_stream(self):
+        string = '{"items": [{"price": 5}], "ok": true}'
+        self.assertListEqual(list(iter_events(string)), [
+            ('', 'start_map', None),
+            ('', 'map_key', 'items'),
+            ('items', 'start_array', None),
+            ('items.item', 'start_map', None),
+            ('items.item', 'map_key', 'price'),
+            ('items.item.price', 'number', 5),
+            ('items.item', 'end_map', None),
+            ('items', 'end_array', None),
+            ('', 'map_key', 'ok'),
+            ('ok', 'boolean', True),
+            ('', 'end_map', None),
+        ])
+
+    def test_items_scalars(self):
+        string = '{"items": [{"price": 5, "name": "a"}, {"price": 1.5}]}'
+        self.assertListEqual(list(items(string, 'items.item.price')), [5, 1.5])
+
+    def test_items_subtrees(self):
+        string = '{"items": [{"tags": ["x", null]}, {"tags": []}], "skip": {"a": 1}}'
+        self.assertListEqual(list(items(string, 'items.item')), [{"tags": ["x", None]}, {"tags": []}])
+
+    def test_items_root(self):
+        string = '[1, {"a": [2]}]'
+        self.assertListEqual(list(items(string, '')), [Parser(string).json])
+
+    def test_invalid_events(self):
+        with self.assertRaises(Exception):
+            list(iter_events('{"a": 1,}'))
+        with self.assertRaisesRegex(Exception, "Unexpected character '@' at index 4"):
+            list(iter_events('[1] @'))
+
+class TestNdjson(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'records.jsonl')
+        self.records = [{"id": i, "tags": ["a", i * 0.5], "ok": i % 2 == 0} for i in range(200)]
+        with open(self.path, 'w') as file:
+            for i, record in enumerate(self.records):
+                file.write(json.dumps(record) + '\n')
+                if i % 10 == 0:
+                    file.write('\n')
+
+    def test_read_path(self):
+        self.assertListEqual(list(read_ndjson(self.path)), self.records)
+
+    def test_read_stream(self):
+        with open(self.path, 'rb') as file:
+            self.assertListEqual(list(read_ndjson(file)), self.records)
+
+    def test_parallel_ordered(self):
+        self.assertListEqual(list(read_ndjson(self.path, workers=2, chunk_size=512)), self.records)
+
+    def test_parallel_unordered_stream(self):
+        with open(self.path, 'rb') as file:
+            values = list(read_ndjson(file, workers=2, ordered=False, chunk_size=512))
+        self.assertListEqual(sorted(values, key=lambda value: value["id"]), self.records)
+
+    def test_invalid_line(self):
+        with self.assertRaises(Exception):
+            list(read_ndjson(io.BytesIO(b'{"a": 1}\n{"a": }\n')))
+
+class TestParseFile(unittest.TestCase):
+
+    def write(self, data):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'document.json')
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_parse_bytes(self):
+        parser = Parser(b'{"name": "J\xc3\xb6hn", "list": [1, 2.5, true, null]}')
+        self.assertDictEqual(parser.json, {"name": "Jöhn", "list": [1, 2.5, True, None]})
+
+    def test_parse_file(self):
+        string = '{\n  "items": [{"id": 1, "tags": ["a", "b"]}, {"id": 2, "tags": []}],\n  "ok": false\n}\n'
+        path = self.write(string.encode('utf-8'))
+        self.assertDictEqual(parse_file(path), Parser(string).json)
+
+    def test_parse_empty_file(self):
+        path = self.write(b'')
+        with self.assertRaises(Exception):
+            parse_file(path)
+
+    def test_parse_file_invalid(self):
+        path = self.write(b'[1, 2')
+        with self.assertRaises(Exception):
+            parse_file(path)
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_corpora_are_deterministic_and_valid(self):
+        for name in benchmark.CORPORA:
+            document = benchmark.generate(name, 2000)
+            self.assertEqual(document, benchmark.generate(name, 2000))
+            if name == 'ndjson':
+                self.assertListEqual(list(read_ndjson(io.BytesIO(document.encode()))), [json.loads(line) for line in document.splitlines()])
+            else:
+                self.assertEqual(Parser(document).json, json.loads(document))
+
+    def test_regressions(self):
+        def results(mb_per_s):
+            return {'cases': {'wide_objects': {'stages': {
+                'parse': {'mb_per_s': mb_per_s},
+                'json': {'mb_per_s': mb_per_s},
+            }}}}
+        self.assertListEqual(benchmark.regressions(results(0.95), results(1.0), 0.1), [])
+        found = benchmark.regressions(results(0.8), results(1.0), 0.1)
+        self.assertEqual(len(found), 1)
+        self.assertTrue(found[0].startswith('wide_objects/parse'))
+
+    def test_memory_regressions(self):
+        def results(peak_mb):
+            return {'cases': {'wide_objects': {'stages': {
+                'tokenize': {'mb_per_s': 1.0, 'peak_mb': 100.0},
+                'parse': {'mb_per_s': 1.0, 'peak_mb': peak_mb},
+            }}}}
+        self.assertListEqual(benchmark.regressions(results(105.0), results(100.0), 0.1), [])
+        found = benchmark.regressions(results(120.0), results(100.0), 0.1)
+        self.assertEqual(len(found), 1)
+        self.assertTrue(found[0].startswith('wide_objects/parse: 120.0 MB peak'))
+
+    def test_peak_mb_per_stage(self):
+        case = benchmark.run_case('wide_objects', 50000, 1)
+        stages = case['stages']
+        # Tokenizing keeps every token, streaming only one at a time.
+        self.assertGreater(stages['tokenize']['peak_mb'], 4 * stages['stream']['peak_mb'])
+        self.assertGreater(stages['parse']['peak_mb'], 0)
+
+class TestParseStats(unittest.TestCase):
+
+    def test_counts(self):
+        stats = ParseStats()
+        parser = Parser('{"name": "John", "scores": [10, 2.5], "nested": {"list": [[]]}}', stats=stats)
+        self.assertEqual(parser.json["scores"], [10, 2.5])
+        self.assertEqual(stats.max_depth, 4)
+        self.assertEqual(stats.string_bytes, len("name" "John" "scores" "nested" "list"))
+        self.assertEqual(stats.number_bytes, len("10" "2.5"))
+        self.assertEqual(stats.tokens[TokenType.JSON_OPEN_BRACKET], 3)
+        self.assertEqual(stats.calls["parse_object"], 2)
+        self.assertDictEqual(dict(stats.allocations), {"token": 7, "string": 5, "number": 2, "array": 3, "object": 2})
+        self.assertIn("tokenize", stats.times)
+        self.assertGreaterEqual(min(stats.times.values()), 0)
+
+    def test_disabled_by_default(self):
+        parser = Parser('[1]')
+        self.assertIsNone(parser.stats)
+        self.assertNotIn("parse_array", vars(parser))
+
+    def test_deep_nesting(self):
+        stats = ParseStats()
+        Parser('[' * 5000 + ']' * 5000, stats=stats)
+        self.assertEqual(stats.max_depth, 5000)
+        self.assertEqual(stats.calls["parse_array"], 5000)
+
+class TestKeyCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertListEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_keys_are_interned(self):
+        parser = Parser('[{"name": 1, "id": 2}, {"name": 3, "id": 4}]')
+        first, second = parser.json
+        self.assertListEqual([a is b for a, b in zip(first, second)], [True, True])
+        self.assertEqual(len(parser.key_cache), 2)
+
+    def test_bytes_and_escaped_keys(self):
+        parser = Parser(b'[{"a\\"b": 1}, {"a\\"b": 2, "c": 3}]')
+        self.assertListEqual(parser.json, [{'a"b': 1}, {'a"b': 2, 'c': 3}])
+
+    def test_shared_key_cache(self):
+        cache = LRUCache(16)
+        Parser('{"name": 1}', key_cache=cache)
+        Parser('{"name": 2}', key_cache=cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_key_cache_disabled(self):
+        parser = Parser('{"name": 1}', key_cache_size=0)
+        self.assertIsNone(parser.key_cache)
+        self.assertDictEqual(parser.json, {"name": 1})
+
+    def test_tuple_records(self):
+        parser = Parser('{"rows": [{"a": 1, "b": [2]}, {"a": 3, "b": []}]}', records='tuple')
+        self.assertTupleEqual(parser.json, ([(1, [2]), (3, [])],))
+
+    def test_namedtuple_records(self):
+        parser = Parser('[{"id": 1, "class": "x"}, {"id": 2, "class": "y"}, {"id": 3}]', records='namedtuple')
+        first, second, third = parser.json
+        self.assertIs(type(first), type(second))
+        self.assertEqual((first.id, first._1), (1, "x"))
+        self.assertEqual(third._fields, ('id',))
+        self.assertEqual(len(parser.shapes), 2)
+
+    def test_unknown_records_mode(self):
+        with self.assertRaises(Exception):
+            Parser('[]', records='dict')
+
+class TestParseCache(unittest.TestCase):
+
+    def test_frozen_results(self):
+        cache = ParseCache()
+        first = cache.parse('{"name": "John", "tags": [1, {"a": []}]}')
+        self.assertIs(cache.parse(b'{"name": "John", "tags": [1, {"a": []}]}'), first)
+        self.assertEqual(first["tags"], (1, {"a": ()}))
+        with self.assertRaises(TypeError):
+            first["name"] = "Jane"
+        with self.assertRaises(TypeError):
+            first["tags"][1]["a"] = 1
+        self.assertDictEqual(cache.as_dict(), {"entries": 1, "bytes": cache.results.bytes, "hits": 1, "misses": 1, "evictions": 0})
+
+    def test_copy_results(self):
+        cache = ParseCache(copy=True)
+        first = cache.parse('{"tags": [1, 2]}')
+        first["tags"].append(3)
+        second = cache.parse('{"tags": [1, 2]}')
+        self.assertDictEqual(second, {"tags": [1, 2]})
+        second["tags"].clear()
+        self.assertDictEqual(cache.parse('{"tags": [1, 2]}'), {"tags": [1, 2]})
+
+    def test_copy_deep_results(self):
+        cache = ParseCache(copy=True)
+        string = '[' * 5000 + ']' * 5000
+        cache.parse(string)
+        value = cache.parse(string)
+        for _ in range(4999):
+            value = value[0]
+        self.assertListEqual(value, [])
+        self.assertEqual(cache.results.hits, 1)
+
+    def test_bounded_by_bytes(self):
+        cache = ParseCache(max_bytes=800)
+        cache.parse('[1]')
+        cache.parse('[2]')
+        self.assertEqual(len(cache.results), 2)
+        cache.parse('[' + ', '.join(['"%d"' % i for i in range(10)]) + ']')
+        self.assertEqual(cache.results.evictions, 1)
+        self.assertNotIn(cache.key('[1]'), cache.results)
+        self.assertLessEqual(cache.results.bytes, 800)
+        # Too big to ever fit, so not kept rather than evicting the rest.
+        cache.parse('[' + ', '.join(['"%d"' % i for i in range(100)]) + ']')
+        self.assertEqual(len(cache.results), 2)
+
+    def test_bounded_by_entries(self):
+        cache = ParseCache(max_entries=2)
+        for string in ('[1]', '[2]', '[1]', '[3]'):
+            cache.parse(string)
+        self.assertIn(cache.key('[1]'), cache.results)
+        self.assertNotIn(cache.key('[2]'), cache.results)
+        self.assertEqual((cache.results.hits, cache.results.misses, cache.results.evictions), (1, 3, 1))
+
+class TestLazyDocument(unittest.TestCase):
+
+    string = '{"meta": {"id": 7, "tags": ["a", "b\\"c"]}, "rows": [[1, 2.5], {}, [], null], "flag" : true}'
+
+    def test_structural_index(self):
+        index = StructuralIndex('{"a": [1, "x,y"]}')
+        self.assertEqual(index.kinds, '{":[,"]}')
+        self.assertListEqual(list(index.positions), [0, 1, 4, 6, 8, 10, 15, 16])
+        self.assertEqual(index.closes[0], 7)
+        self.assertEqual(index.closes[3], 6)
+
+    def test_lookup(self):
+        for input in (self.string, self.string.encode('utf-8')):
+            doc = LazyDocument(input)
+            self.assertEqual(doc["meta"]["tags"][1], 'b"c')
+            self.assertEqual(doc["rows"][0][1], 2.5)
+            self.assertIsNone(doc["rows"][3])
+            self.assertIs(doc["flag"], True)
+            self.assertEqual(len(doc["rows"]), 4)
+            self.assertEqual(len(doc["rows"][1]), 0)
+            self.assertListEqual(list(doc), ["meta", "rows", "flag"])
+            self.assertIsNone(doc["meta"].get("missing"))
+            self.assertListEqual(list(doc.keys()), ["meta", "rows", "flag"])
+            self.assertEqual(doc.get("flag"), True)
+            self.assertEqual(doc.get("missing", 0), 0)
+            self.assertIn("rows", doc)
+            self.assertNotIn("missing", doc)
+
+    def test_only_touched_values_are_walked(self):
+        doc = LazyDocument(self.string)
+        doc["flag"]
+        self.assertTrue("rows" in doc)
+        self.assertListEqual(list(doc.views), [0])
+
+    def test_materialize(self):
+        doc = LazyDocument(self.string)
+        self.assertDictEqual(doc.materialize(), Parser(self.string).json)
+        self.assertListEqual(doc["meta"]["tags"].materialize(), ["a", 'b"c'])
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(Exception, "Unexpected character ']' at index 7"):
+            LazyDocument('{"a": 1]')
+        with self.assertRaisesRegex(Exception, "Input should either have an object or an array."):
+            LazyDocument('"a"')
+        # Values are only checked once they are looked at.
+        doc = LazyDocument('[1,]')
+        self.assertEqual(doc[0], 1)
+        with self.assertRaisesRegex(Exception, "Missing value at index 3"):
+            doc[1]
+        with self.assertRaises(Exception):
+            LazyDocument('{"a": tru}')["a"]
+
+class TestValidate(unittest.TestCase):
+
+    def assertSameError(self, input, max_depth=None):
+        with self.assertRaises(Exception) as parsed:
+            Parser(input, max_depth=max_depth)
+        with self.assertRaises(Exception) as validated:
+            validate(input, max_depth=max_depth)
+        self.assertEqual(str(validated.exception), str(parsed.exception))
+
+    def test_valid(self):
+        string = '{"a": [1, -2.5e3, "x\\"y", "\\u00e9", true, null, {"b": []}], "c": {}}'
+        for input in (string, string.encode('utf-8'), ' [ ] ', '[[[]]]'):
+            self.assertIsNone(validate(input))
+
+    def test_long_runs(self):
+        records = [{"id": i, "name": "n%d" % i, "tags": ["a", "b\\n"] if i % 100 == 0 else ["a"]} for i in range(2000)]
+        string = json.dumps({"rows": records, "numbers": list(range(5000))})
+        self.assertIsNone(validate(string))
+        self.assertSameError(string[:-2] + ',]}')
+        self.assertSameError(string.replace('"n1500"', '"n1500\\q"'))
+        self.assertSameError(string.replace('4999', '04999'))
+
+    def test_escaped_strings(self):
+        # Runs stop in front of the next backslash, which is only searched
+        # for again once it is passed, so strings with escapes do not make
+        # every token look ahead a whole run.
+        string = '[' + ','.join(['"a\\nb"'] * 50000) + ']'
+        with run_lookahead('validate') as lookahead:
+            self.assertIsNone(validate(string))
+        self.assertLess(sum(lookahead), 2 * len(string))
+
+    def test_same_errors_as_parser(self):
+        for input in ('', '1', '{"a" 1}', '{"a": 1,}', '[1 2]', '[1, tru]', '["a\\x"]',
+                      '[1.]', '{"a": [}', '[1', '[', '[01]', b'["\xff"]', b'[1, "\xc3"]',
+                      '[1] @', '{"a": 1} x', '[] "\\q"', '[] 01'):
+            self.assertSameError(input)
+
+    def test_max_depth(self):
+        self.assertIsNone(validate('[[[1, [2]]]]', max_depth=4))
+        self.assertSameError('[[[1, [2]]]]', max_depth=3)
+        self.assertSameError('[0, [1, [2]]]', max_depth=2)
+
+class TestParseMany(unittest.TestCase):
+
+    documents = ['{"a": %d}' % i for i in range(50)] + ['{"a": }', b'[1, 2]', '[[[1]]]']
+
+    def test_executors(self):
+        expected = [{"a": i} for i in range(50)]
+        for executor in ('serial', 'thread', 'process'):
+            results = list(parse_many(self.documents, executor=executor, chunksize=8, workers=2))
+            self.assertListEqual(results[:50], expected)
+            self.assertEqual(str(results[50]), "Unexpected token '}' at index 5 (line 1, column 7)")
+            self.assertListEqual(results[51], [1, 2])
+            self.assertListEqual(results[52], [[[1]]])
+
+    def test_max_depth(self):
+        results = list(parse_many(self.documents, max_depth=2))
+        self.assertRegex(str(results[52]), 'Maximum nesting depth of 2 exceeded')
+
+    def test_reused_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            for _ in range(2):
+                self.assertListEqual(list(parse_many(['[1]', '[2]'], executor=executor, chunksize=1)), [[1], [2]])
+
+    def test_bounded_results(self):
+        submitted = []
+        def tasks():
+            for i in range(10):
+                submitted.append(i)
+                future = Future()
+                future.set_result([i])
+                yield future
+        results = bounded_results(tasks(), 3)
+        self.assertEqual(next(results), 0)
+        self.assertEqual(len(submitted), 3)
+        self.assertListEqual(list(results), list(range(1, 10)))
+
+    def test_unknown_executor(self):
+        with self.assertRaisesRegex(Exception, "Unknown executor 'fork'"):
+            list(parse_many(self.documents, executor='fork'))
+
+class TestAsyncStream(unittest.TestCase):
+
+    def collect(self, source):
+        async def run():
+            return [value async for value in iter_values(source)]
+        return asyncio.run(run())
+
+    def test_stream_reader(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'{"a": 1}\n[1, 2]\n{"b": "\xc3')
+            reader.feed_data(b'\xa9"}{"c": []}  \n')
+            reader.feed_eof()
+            return [value async for value in iter_values(reader)]
+        self.assertListEqual(asyncio.run(run()), [{"a": 1}, [1, 2], {"b": "é"}, {"c": []}])
+
+    def test_async_iterator(self):
+        async def chunks():
+            for chunk in ('[1, [2', ', 3]]', '', '{"a"', ':"x"}'):
+                yield chunk
+        self.assertListEqual(self.collect(chunks()), [[1, [2, 3]], {"a": "x"}])
+
+    def test_large_chunk(self):
+        records = [{"id": i, "name": "n%d" % i} for i in range(5000)]
+        async def chunks():
+            yield '\n'.join(map(json.dumps, records)).encode('utf-8')
+        self.assertListEqual(self.collect(chunks()), records)
+
+    def test_errors(self):
+        async def chunks(*parts):
+            for part in parts:
+                yield part
+        with self.assertRaisesRegex(Exception, "Unexpected end of input at index 2"):
+            self.collect(chunks('[1] [1'))
+
+        values = []
+        async def run():
+            async for value in iter_values(chunks('[1] {"a" 1}')):
+                values.append(value)
+        with self.assertRaisesRegex(Exception, "Unexpected token '1' at index 4"):
+            asyncio.run(run())
+        self.assertListEqual(values, [[1]])
+
+    def test_long_string_keeps_feeds_short(self):
+        # Each feed only looks at its own chunk of an open string, so the
+        # event loop gets control back quickly however long the string is.
+        # The string is lexed in full once, by the feed that ends it.
+        blob = 'A' * (1 << 20)
+        data = ('{"blob": "' + blob + '"}').encode('utf-8')
+        parser = StreamParser()
+        lexed = count_lexed(parser.lexer)
+        for start in range(0, len(data), FEED_SIZE):
+            parser.feed(data[start:start + FEED_SIZE])
+        self.assertEqual(parser.close()[0]["blob"], blob)
+        self.assertLessEqual(sorted(lexed)[-2], FEED_SIZE)
+        self.assertLess(sum(lexed), 2 * len(data))
+
+class TestEncoder(unittest.TestCase):
+
+    value = {"a": [1, 2.5, -3e100, True, False, None, 'x"\\\n\x01é'], "b": {}, "c": [], "d": {"e": [[]]}}
+
+    def test_dumps(self):
+        self.assertEqual(dumps(self.value), json.dumps(self.value, separators=(',', ':'), ensure_ascii=False))
+        self.assertEqual(dumps(self.value, indent=2), json.dumps(self.value, indent=2, ensure_ascii=False))
+        self.assertEqual(dumps({"b": 1, "a": [2]}, sort_keys=True), '{"a":[2],"b":1}')
+
+    def test_round_trip(self):
+        for string in (benchmark.generate('pretty_printed', 20000), '["\\ud800", "\\u001f"]'):
+            value = Parser(string).json
+            self.assertEqual(Parser(dumps(value)).json, value)
+
+    def test_records_and_frozen_values(self):
+        rows = Parser('[{"a": 1, "b": [2]}, {"a": 3, "b": []}]', records='namedtuple').json
+        self.assertEqual(dumps(rows), '[{"a":1,"b":[2]},{"a":3,"b":[]}]')
+        self.assertEqual(dumps(ParseCache().parse('{"a": [1, {}]}')), '{"a":[1,{}]}')
+
+    def test_deep_nesting(self):
+        value = []
+        for _ in range(100000):
+            value = [value]
+        self.assertEqual(dumps(value), '[' * 100001 + ']' * 100001)
+
+    def test_dump(self):
+        value = Parser(benchmark.generate('wide_objects', 200000)).json
+        expected = dumps(value, indent=1)
+        buffer = bytearray(b'x')
+        dump(value, buffer, indent=1)
+        self.assertEqual(buffer, b'x' + expected.encode('utf-8'))
+        stream = io.BytesIO()
+        dump(value, stream, indent=1)
+        self.assertEqual(stream.getvalue().decode('utf-8'), expected)
+        text = io.StringIO()
+        dump(value, text, indent=1)
+        self.assertEqual(text.getvalue(), expected)
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(Exception, 'Cannot write nan as JSON'):
+            dumps([float('nan')])
+        with self.assertRaisesRegex(Exception, 'Keys must be strings, got int'):
+            dumps({1: 2})
+        with self.assertRaisesRegex(Exception, 'Object of type set is not JSON serializable'):
+            dumps({"a": {1}})
+
+class TestTypedArrays(unittest.TestCase):
+
+    string = '{"t": [1, 2, -3], "v": [1.5, 2, -3e2], "rows": [[0, 1], [], [1, "x"]], "big": [18446744073709551616]}'
+
+    def test_typed_arrays(self):
+        for input in (self.string, self.string.encode('utf-8')):
+            result = Parser(input, typed_arrays='array').json
+            self.assertEqual(result["t"], array('q', [1, 2, -3]))
+            self.assertEqual(result["v"], array('d', [1.5, 2.0, -300.0]))
+            self.assertEqual(result["rows"][0], array('q', [0, 1]))
+            self.assertListEqual(result["rows"][1], [])
+            self.assertListEqual(result["rows"][2], [1, "x"])
+            self.assertListEqual(result["big"], [18446744073709551616])
+        self.assertEqual(Parser(' [ 1 ,\n2 ] ', typed_arrays='array').json, array('q', [1, 2]))
+
+    def test_same_values_as_lists(self):
+        string = benchmark.generate('number_arrays', 50000)
+        self.assertListEqual(list(Parser(string, typed_arrays='array').json), Parser(string).json)
+        self.assertEqual(dumps(Parser('{"a": [[1, 2]]}', typed_arrays='array').json), '{"a":[[1,2]]}')
+
+    def test_errors(self):
+        for input, max_depth in (('{"a": [1, 2], "b" 1}', None), ('[[1, 2], 3 4]', None), ('[[1, 01]]', None), ('[1, 2.]', None), ('[[1]]', 1), ('[1]', 0)):
+            with self.assertRaises(Exception) as expected:
+                Parser(input, max_depth=max_depth)
+            with self.assertRaisesRegex(Exception, re.escape(str(expected.exception))):
+                Parser(input, max_depth=max_depth, typed_arrays='array')
+
+    def test_longer_than_one_run(self):
+        # Arrays are matched a run of numbers at a time.
+        numbers = list(range(10000))
+        string = json.dumps(numbers)
+        self.assertEqual(Parser(string, typed_arrays='array').json, array('q', numbers))
+        with self.assertRaisesRegex(Exception, "Unexpected character '.' at index 4"):
+            Parser(string.replace(', 9001,', ', 9001.,'), typed_arrays='array')
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+    def test_numpy(self):
+        result = Parser(self.string, typed_arrays='numpy').json
+        self.assertEqual(result["v"].dtype.kind, 'f')
+        self.assertListEqual(result["t"].tolist(), [1, 2, -3])
+
+    def test_unknown_mode(self):
+        with self.assertRaisesRegex(Exception, "Unknown typed arrays mode 'list'"):
+            Parser('[1]', typed_arrays='list')
+
+class TestSourceMap(unittest.TestCase):
+
+    string = '{"a": [1, "x", {"b/c": null}],\n "d~": {},\n "e": [2.5, 3]}'
+
+    def test_source_map(self):
+        for input in (self.string, self.string.encode('utf-8')):
+            source_map = Parser(input, source_map=True).source_map
+            ranges = {path: input[start:end] for path, (start, end) in source_map.items()}
+            self.assertEqual(ranges[''], input)
+            self.assertEqual(ranges['/a'], input[6:29])
+            self.assertEqual(ranges['/a/1'], input[10:13])
+            self.assertEqual(ranges['/a/2/b~1c'], input[23:27])
+            self.assertEqual(ranges['/d~0'], input[38:40])
+            self.assertEqual(ranges['/e/0'], input[49:52])
+            self.assertEqual(len(source_map), 10)
+        self.assertIsNone(Parser(self.string).source_map)
+
+    def test_typed_arrays(self):
+        source_map = Parser(self.string, source_map=True, typed_arrays='array').source_map
+        self.assertEqual(source_map['/e'], (48, 56))
+        self.assertNotIn('/e/0', source_map)
+
+    def test_line_index(self):
+        lines = LineIndex('ab\ncd\n\nef')
+        self.assertEqual(lines.location(0), (1, 1))
+        self.assertEqual(lines.location(2), (1, 3))
+        self.assertEqual(lines.location(3), (2, 1))
+        self.assertEqual(lines.location(6), (3, 1))
+        self.assertEqual(lines.location(8), (4, 2))
+        self.assertEqual(LineIndex(b'a\nb').location(2), (2, 1))
+
+    def test_error_location(self):
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected token '1' at index 16 (line 2, column 9)")):
+            Parser('{"a": [1, 2],\n "b": 1 1}')
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected end of input at index 4 (line 3, column 1)")):
+            Parser('[1,\n2\n')
+
+    def test_lexer_error_location(self):
+        # Errors the lexer finds keep their message and also get a location.
+        string = '{"a": [1, 2],\n "b": [3, 12+]}'
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected character '+' at index 2 (line 2, column 13)")):
+            Parser(string)
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected character '+' at index 2 (line 2, column 13)")):
+            validate(string)
+        with self.assertRaisesRegex(Exception, re.escape("Missing end quote. (line 2, column 7)")):
+            Parser('[1,\n "a", "b]')
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected character '@' at index 7 (line 2, column 4)")):
+            Parser('[1,\n2, @]'.encode('utf-8'))
+
+class TestQuery(unittest.TestCase):
+
+    string = '{"items": [{"id": 1, "price": 5, "tags": ["a"]}, {"id": 2, "price": 15, "tags": []}, {"id": "x/y", "price": 9.5}], "meta": {"a/b": {"c~": [1, [2, 3]]}}, "n": null}'
+
+    def test_json_pointer(self):
+        for input in (self.string, self.string.encode('utf-8')):
+            self.assertListEqual(query(input, '/items/1'), [{"id": 2, "price": 15, "tags": []}])
+            self.assertListEqual(query(input, '/meta/a~1b/c~0/1/0'), [2])
+            self.assertListEqual(query(input, '/n'), [None])
+            self.assertListEqual(query(input, ''), [Parser(self.string).json])
+            self.assertListEqual(query(input, '/missing'), [])
+            self.assertListEqual(query(input, '/items/5/id'), [])
+
+    def test_wildcards(self):
+        self.assertListEqual(query(self.string, '/items/*/id'), [1, 2, "x/y"])
+        self.assertListEqual(query(self.string, '/items/*/tags/*'), ["a"])
+        self.assertListEqual(query(self.string, '$.items[*].id'), [1, 2, "x/y"])
+        self.assertEqual(len(query(self.string, '$.*')), 3)
+
+    def test_jsonpath(self):
+        self.assertListEqual(query(self.string, "$['meta']['a/b']"), [{"c~": [1, [2, 3]]}])
+        self.assertListEqual(query(self.string, '$.items[0].tags[0]'), ["a"])
+        self.assertListEqual(query(self.string, '$.items[?(@.price > 8)].id'), [2, "x/y"])
+        self.assertListEqual(query(self.string, "$.items[?(@.id == 'x/y')].price"), [9.5])
+        self.assertListEqual([item["id"] for item in query(self.string, '$.items[?(@.tags)]')], [1, 2])
+        self.assertListEqual(query(self.string, '$.meta[?(@.x == 1)]'), [])
+
+    def test_filter_equality(self):
+        # Booleans only equal booleans, and numbers only numbers.
+        string = '[{"p": true}, {"p": 1}, {"p": 1.0}, {"p": 0}, {"p": false}, {"p": [1, true]}]'
+        self.assertListEqual(query(string, '$[?(@.p == 1)]'), [{"p": 1}, {"p": 1.0}])
+        self.assertListEqual(query(string, '$[?(@.p == true)]'), [{"p": True}])
+        self.assertListEqual(query(string, '$[?(@.p == false)]'), [{"p": False}])
+        self.assertListEqual(query(string, '$[?(@.p == [1, true])]'), [{"p": [1, True]}])
+        self.assertListEqual(query(string, '$[?(@.p != 0)].p'), [True, 1, 1.0, False, [1, True]])
+        self.assertListEqual(query('{"a": [true, 1]}', '$.a[?(@ == true)]'), [True])
+
+    def test_early_termination(self):
+        # Everything after the value read is never looked at.
+        self.assertListEqual(query('{"a": {"b": 1}, "c": [1,,]}', '/a/b'), [1])
+        with self.assertRaisesRegex(Exception, "Unexpected character ',' at index 20"):
+            query('{"a": {"b": 1}, "c": [1,,]}', '/*/b')
+        # Reading to the end of the document checks what follows it too.
+        self.assertListEqual(query('[1] @', '/0'), [1])
+        with self.assertRaisesRegex(Exception, "Unexpected character '@' at index 4"):
+            query('[1] @', '/*')
+
+    def test_escaped_strings(self):
+        # Runs of members stop in front of the next backslash, which is only
+        # searched for again once the scan is past it.
+        records = [{"id": i, "url": "http://x/%d" % i, "tags": ["a", "b"]} for i in range(10000)]
+        string = '{"records": ' + json.dumps(records).replace('/', '\\/') + ', "z": 1}'
+        with run_lookahead('query') as lookahead:
+            self.assertListEqual(query(string, '/z'), [1])
+        self.assertLess(sum(lookahead), 2 * len(string))
+
+    def test_duplicate_keys(self):
+        # The first member with a key is selected, so the scan can stop
+        # there; `Parser` keeps the last one.
+        self.assertListEqual(query('{"a": 1, "a": 2}', '/a'), [1])
+        self.assertListEqual(query('{"a": 1, "a": 2}', '/*'), [1, 2])
+
+    def test_same_errors_as_parser(self):
+        for input in ('{"a": [1, 2', '"a"', '{"a": 01}', '{"x": "\\q", "a": 1}', '{"a" 1}'):
+            with self.assertRaises(Exception) as expected:
+                Parser(input)
+            with self.assertRaisesRegex(Exception, re.escape(str(expected.exception))):
+                query(input, '/a')
+
+    def test_invalid_path(self):
+        with self.assertRaisesRegex(Exception, "Invalid path 'a/b'"):
+            query(self.string, 'a/b')
+        with self.assertRaisesRegex(Exception, "Invalid path '\\$.items\\[-1\\]' at index 7"):
+            query(self.string, '$.items[-1]')
+        with self.assertRaisesRegex(Exception, "Invalid filter '@.price ~ 3'"):
+            query(self.string, '$.items[?(@.price ~ 3)]')
+
+class TestDocuments(unittest.TestCase):
+
+    def test_concatenated_values(self):
+        input = '{"a": 1}{"b": [1, 2]}\n3 "x" true\n[]'
+        expected = [({"a": 1}, 8), ({"b": [1, 2]}, 21), (3, 23), ("x", 27), (True, 32), ([], 35)]
+        self.assertListEqual(list(iter_documents(input)), expected)
+        self.assertListEqual(list(iter_documents(input.encode('utf-8'))), expected)
+        self.assertListEqual(list(iter_documents('  \n')), [])
+
+    def test_resume_from_offset(self):
+        input = '{"id": 1}\n{"id": 2}\n{"id": 3}\n'
+        values = list(iter_documents(input))
+        self.assertListEqual(list(iter_documents(input, values[0][1])), values[1:])
+
+    def test_errors(self):
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected token '}' at index 0 (line 1, column 3)")):
+            list(iter_documents('1 }'))
+        with self.assertRaisesRegex(Exception, re.escape("Unexpected token '2' at index 4 (line 2, column 6)")):
+            list(iter_documents('{"a": 1}\n{"a" 2}'))
+
+    def test_skip_errors(self):
+        input = '{"id": 1}\n{"id": [2,\n{"id": 3}\n{"id":'
+        results = iter_documents(input, skip_errors=True)
+        self.assertEqual(next(results), ({"id": 1}, 9))
+        error, offset = next(results)
+        self.assertIsInstance(error, Exception)
+        self.assertEqual(offset, 21)
+        self.assertEqual(next(results), ({"id": 3}, 30))
+        # The last record may still be being written, so it is not skipped.
+        with self.assertRaisesRegex(Exception, 'Unexpected end of input'):
+            next(results)
+
+    def test_number_at_end_of_input(self):
+        # The number may still be being written, so it is not yielded.
+        results = iter_documents('{"a": 1}\n12', skip_errors=True)
+        self.assertEqual(next(results), ({"a": 1}, 8))
+        with self.assertRaisesRegex(Exception, re.escape('Unexpected end of input at index 1 (line 2, column 3)')):
+            next(results)
+        self.assertListEqual(list(iter_documents('{"a": 1}\n123\n', 8)), [(123, 12)])
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.jsonl')
+            with open(path, 'wb') as file:
+                file.write(b'{"id": 1}\n{"id": 2}\n')
+            self.assertListEqual(list(iter_file_documents(path, 10)), [({"id": 2}, 19)])
+            open(path, 'wb').close()
+            self.assertListEqual(list(iter_file_documents(path)), [])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,273 @@
+import codecs
+import re
+from lexer import Lexer, TokenType
+from lexer import GROUP_TOKENS, GROUP_TYPES, STRING, ESCAPED_STRING, NUMBER, INVALID_NUMBER, check_number, unescape
+from parser import OBJECT_TRANSITIONS, ARRAY_TRANSITIONS
+from sourcemap import LineIndex
+
+# A run of members taken in a single match: `, value` repeated in arrays,
+# `, "key": value` in objects. A value is a scalar, or an object or array
+# nested up to CONTAINER_LEVELS deep that holds no deeper ones. Strings and
+# numbers match exactly what the lexer accepts. Strings are matched up to
+# the first quote not preceded by a backslash, like the lexer's fast path;
+# a run that contains a backslash is cut short in front of it, so escapes
+# are always checked one token at a time. Anything a run takes would have
+# lexed and parsed the same way one token at a time.
+#
+# The regex engine keeps state for every repetition until the match ends,
+# so repetitions are capped at RUN_LENGTH members. A run is taken again
+# while it makes progress, so memory stays flat however long the array is.
+RUN_LENGTH = 256
+CONTAINER_LEVELS = 2
+WHITESPACE = r'[ \t\n\r]*'
+STRING_PATTERN = r'"[^"]*(?<!\\)"'
+SCALAR_PATTERN = r'(?:{}|-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?(?![-+0-9.eE])|null|true|false)'.format(STRING_PATTERN)
+ARRAY_MEMBER = r'{ws},{ws}{value}'
+OBJECT_MEMBER = r'{ws},{ws}' + STRING_PATTERN + r'{ws}:{ws}{value}'
+
+def container_pattern(value: str) -> str:
+    # Objects and arrays whose values match `value`.
+    array = r'\[{ws}(?:{value}(?:{ws},{ws}{value}){{0,{length}}})?{ws}\]'
+    object = r'\{{{ws}(?:{string}{ws}:{ws}{value}(?:{ws},{ws}{string}{ws}:{ws}{value}){{0,{length}}})?{ws}\}}'
+    return ('(?:' + array + '|' + object + ')').format(ws=WHITESPACE, value=value, string=STRING_PATTERN, length=RUN_LENGTH)
+
+def run_patterns(levels: int) -> tuple[str, str]:
+    value = SCALAR_PATTERN
+    for _ in range(levels):
+        value = '(?:' + SCALAR_PATTERN + '|' + container_pattern(value) + ')'
+    return tuple(
+        '(?:' + member.format(ws=WHITESPACE, value=value) + '){{0,{}}}'.format(RUN_LENGTH)
+        for member in (ARRAY_MEMBER, OBJECT_MEMBER)
+    )
+
+# (array run, object run) by nesting allowed, for str and for bytes input.
+TEXT_RUNS = {levels: tuple(map(re.compile, run_patterns(levels))) for levels in (0, CONTAINER_LEVELS)}
+BUFFER_RUNS = {levels: tuple(re.compile(pattern.encode('ascii')) for pattern in run_patterns(levels)) for levels in (0, CONTAINER_LEVELS)}
+TEXT_STRING_BODY = re.compile(r'[^"\\]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\]*)*')
+BUFFER_STRING_BODY = re.compile(TEXT_STRING_BODY.pattern.encode('ascii'))
+
+# The DFA state that follows a value in an array and in an object.
+ARRAY_VALUE_STATE = 3
+OBJECT_VALUE_STATE = 5
+
+UTF8_CHUNK_SIZE = 1 << 16
+
+def validate(input: str | bytes, max_depth: int | None = None) -> None:
+    # Checks `input` the way `Parser` does and raises the same error with
+    # the same index, without building any values or tokens. Returns None
+    # for well-formed input.
+    #
+    # Well-formed input is accepted by `is_valid`, which takes whole runs of
+    # members per match. Anything it does not accept is checked again
+    # one token at a time by `check`, which finds the exact error.
+    if not is_valid(input, max_depth):
+        check(input, max_depth)
+
+def is_valid(input: str | bytes, max_depth: int | None = None) -> bool:
+    # True only for input `check` accepts. It may give up on some valid
+    # input too; it never says where an error is.
+    lexer = Lexer(input)
+    match = lexer.pattern.match
+    backslash = lexer.backslash
+    runs = BUFFER_RUNS if lexer.is_buffer else TEXT_RUNS
+    string_body = (BUFFER_STRING_BODY if lexer.is_buffer else TEXT_STRING_BODY).fullmatch
+
+    # `Parser` decodes every string of bytes-like input as UTF-8.
+    if lexer.is_buffer and not is_utf8(input):
+        return False
+
+    found = match(input)
+    if found is None or (max_depth is not None and max_depth < 1):
+        return False
+    kind = found.lastindex
+    if GROUP_TYPES[kind] is TokenType.JSON_OPEN_BRACE:
+        transitions = OBJECT_TRANSITIONS
+    elif GROUP_TYPES[kind] is TokenType.JSON_OPEN_BRACKET:
+        transitions = ARRAY_TRANSITIONS
+    else:
+        return False
+
+    # (transitions, state to resume in) per enclosing container.
+    stack = []
+    current_state = 1
+    position = found.end()
+    # Offset of the next backslash, kept between calls to `skip_runs`.
+    escape = -1
+
+    while True:
+        found = match(input, position)
+        if found is None:
+            return False
+        kind = found.lastindex
+        position = found.end()
+
+        if kind == INVALID_NUMBER:
+            return False
+        if kind == STRING or kind == ESCAPED_STRING:
+            start, end = found.span(kind)
+            if (kind == ESCAPED_STRING or input.find(backslash, start, end) >= 0) and string_body(input, start, end) is None:
+                return False
+
+        token_type = GROUP_TYPES[kind]
+        next_state = transitions[current_state].get(token_type)
+
+        if next_state is None:
+            return False
+        if next_state == 2:
+            if not stack:
+                try:
+                    check_rest(lexer, position)
+                except Exception:
+                    return False
+                return True
+            transitions, current_state = stack.pop()
+        elif token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+            stack.append((transitions, next_state))
+            if max_depth is not None and len(stack) >= max_depth:
+                return False
+            transitions = OBJECT_TRANSITIONS if token_type is TokenType.JSON_OPEN_BRACE else ARRAY_TRANSITIONS
+            current_state = 1
+        else:
+            current_state = next_state
+            if transitions is ARRAY_TRANSITIONS and next_state == ARRAY_VALUE_STATE:
+                is_object = False
+            elif transitions is OBJECT_TRANSITIONS and next_state == OBJECT_VALUE_STATE:
+                is_object = True
+            else:
+                continue
+
+            # Containers inside a run are not counted against `max_depth`,
+            # so they are only taken where they cannot exceed it.
+            levels = CONTAINER_LEVELS if max_depth is None or len(stack) + CONTAINER_LEVELS < max_depth else 0
+            position, escape = skip_runs(input, position, escape, runs[levels][is_object].match, backslash)
+
+def skip_runs(input: str | bytes, position: int, escape: int, run, backslash: str | bytes) -> tuple[int, int]:
+    # Takes `run` from `position` while it makes progress. `escape` is the
+    # offset of the next backslash, which runs stop in front of; it is only
+    # looked for again once `position` is past it. Returns the new position
+    # and escape.
+    if escape < position:
+        escape = input.find(backslash, position)
+        if escape < 0:
+            escape = len(input)
+    while True:
+        end = run(input, position, escape).end()
+        if end == position:
+            return position, escape
+        position = end
+
+def check(input: str | bytes, max_depth: int | None = None) -> None:
+    # Runs the same checks as `Parser` and raises the same error, but builds
+    # no values and no tokens: the lexer's matches are fed straight into the
+    # object and array DFAs, and only the state of each open container is
+    # kept.
+    lexer = Lexer(input)
+    pointer = -1
+    # (transitions, state to resume in) per enclosing container.
+    stack = []
+    transitions = None
+    current_state = 0
+    found = None
+
+    for found in iter(lexer.pattern.scanner(input).match, None):
+        kind = found.lastindex
+        token_type = GROUP_TYPES[kind]
+        pointer += 1
+
+        check_token(lexer, found)
+
+        if transitions is None:
+            if token_type is not TokenType.JSON_OPEN_BRACE and token_type is not TokenType.JSON_OPEN_BRACKET:
+                value = '"' if token_type is TokenType.JSON_STRING else token_value(lexer, found)
+                raise located(f"Unexpected token '{value}' at index {pointer}", input, found)
+            if max_depth is not None and max_depth < 1:
+                raise located('Maximum nesting depth of {} exceeded at index {}'.format(max_depth, pointer), input, found)
+            transitions = OBJECT_TRANSITIONS if token_type is TokenType.JSON_OPEN_BRACE else ARRAY_TRANSITIONS
+            current_state = 1
+            continue
+
+        if token_type is TokenType.JSON_STRING:
+            # The quotes around a string count as tokens of their own.
+            pointer += 2
+
+        next_state = transitions[current_state].get(token_type)
+
+        if next_state is None:
+            if transitions is OBJECT_TRANSITIONS:
+                raise located(f"Unexpected token '{token_value(lexer, found)}' at index {pointer}", input, found)
+            raise located(f"Unexpected character '{token_value(lexer, found)}' at index {pointer}", input, found)
+
+        if lexer.is_buffer and kind == STRING:
+            # Where `Parser` decodes the string, raising on invalid UTF-8.
+            start, end = found.span(STRING)
+            input[start:end].decode('utf-8')
+
+        if next_state == 2:
+            if not stack:
+                check_rest(lexer, found.end())
+                return
+            transitions, current_state = stack.pop()
+        elif token_type is TokenType.JSON_OPEN_BRACE or token_type is TokenType.JSON_OPEN_BRACKET:
+            stack.append((transitions, next_state))
+            if max_depth is not None and len(stack) >= max_depth:
+                raise located('Maximum nesting depth of {} exceeded at index {}'.format(max_depth, pointer), input, found)
+            transitions = OBJECT_TRANSITIONS if token_type is TokenType.JSON_OPEN_BRACE else ARRAY_TRANSITIONS
+            current_state = 1
+        else:
+            current_state = next_state
+
+    lexer.check_end(found.end() if found is not None else 0)
+    if transitions is None:
+        raise Exception("Input should either have an object or an array.")
+    raise Exception('Unexpected end of input at index {} {}'.format(pointer + 1, LineIndex(input).describe(len(input))))
+
+def check_token(lexer: Lexer, found: re.Match) -> None:
+    # What the lexer itself would reject.
+    kind = found.lastindex
+    if kind == STRING or kind == ESCAPED_STRING:
+        start, end = found.span(kind)
+        if kind == ESCAPED_STRING or lexer.input.find(lexer.backslash, start, end) >= 0:
+            unescape(lexer.input[start:end], start, lexer.line_index)
+    elif kind == INVALID_NUMBER:
+        check_number(lexer.chars(*found.span(INVALID_NUMBER)), found.start(INVALID_NUMBER), lexer.line_index)
+
+def check_rest(lexer: Lexer, position: int) -> None:
+    # `Parser` stops at the end of the top-level value, but what follows it
+    # must still lex.
+    found = None
+    for found in iter(lexer.pattern.scanner(lexer.input, position).match, None):
+        check_token(lexer, found)
+    lexer.check_end(found.end() if found is not None else position)
+
+def located(message: str, input: str | bytes, found: re.Match) -> Exception:
+    # `message` with the line and column of the token `found` matched, the
+    # way `Parser.error` gives them.
+    kind = found.lastindex
+    offset = found.start(kind)
+    if kind == STRING or kind == ESCAPED_STRING:
+        offset -= 1
+    return Exception('{} {}'.format(message, LineIndex(input).describe(offset)))
+
+def is_utf8(input: bytes) -> bool:
+    # Decodes in chunks, throwing the text away, so memory stays flat.
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(input)
+    try:
+        for start in range(0, len(view), UTF8_CHUNK_SIZE):
+            decoder.decode(view[start:start + UTF8_CHUNK_SIZE])
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def token_value(lexer: Lexer, found: re.Match) -> object:
+    # The value `Lexer.iter_tokens` gives the token of a match, for errors.
+    kind = found.lastindex
+    if kind == STRING or kind == ESCAPED_STRING:
+        value = found.group(kind)
+        if lexer.backslash in value:
+            value = unescape(value, found.start(kind))
+        return value
+    if kind == NUMBER:
+        return found.group(NUMBER)
+    return GROUP_TOKENS[kind].value